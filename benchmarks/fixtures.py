@@ -0,0 +1,121 @@
+import io
+import os
+import random
+import fitz  # PyMuPDF
+import docx
+from docx.shared import Inches as DocxInches
+from pptx import Presentation
+from pptx.util import Inches
+from PIL import Image, ImageDraw
+
+WORDS = (
+    "model training data gradient descent loss function neural network layer "
+    "attention transformer token embedding evaluation accuracy precision recall "
+    "overfitting regularization dataset feature pipeline deployment inference"
+).split()
+
+def random_sentence(rng, min_words=8, max_words=20):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+def random_paragraph(rng, sentences=5):
+    return " ".join(random_sentence(rng) for _ in range(sentences))
+
+def text_image_bytes(rng, width=640, height=240, label=None):
+    """
+    PNG with a few lines of dark text on a light background, i.e. something
+    image triage keeps and OCR has work to do on.
+    """
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    y = 10
+    while y < height - 20:
+        draw.text((10, y), label or random_sentence(rng, 4, 8), fill="black")
+        y += 18
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def make_pdf(path, pages=20, images_per_page=1, words_per_page=300, seed=0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        body = " ".join(random_paragraph(rng) for _ in range(max(1, words_per_page // 75)))
+        page.insert_textbox(fitz.Rect(50, 50, 545, 420), f"Page {page_num + 1}\n{body}", fontsize=8)
+        for i in range(images_per_page):
+            top = 430 + i * 100
+            if top + 90 > 800:
+                break
+            page.insert_image(fitz.Rect(50, top, 450, top + 90), stream=text_image_bytes(rng))
+    doc.save(path)
+    doc.close()
+    return path
+
+def make_docx(path, paragraphs=60, images=10, seed=0):
+    rng = random.Random(seed)
+    document = docx.Document()
+    image_every = max(1, paragraphs // max(1, images)) if images else 0
+    for i in range(paragraphs):
+        document.add_paragraph(random_paragraph(rng))
+        if image_every and i % image_every == 0 and images > 0:
+            document.add_picture(io.BytesIO(text_image_bytes(rng)), width=DocxInches(4))
+            images -= 1
+    document.save(path)
+    return path
+
+def make_pptx(path, slides=30, images_per_slide=1, repeated_logo=True, seed=0):
+    rng = random.Random(seed)
+    prs = Presentation()
+    logo = text_image_bytes(rng, 200, 60, label="ACME Training")
+    for slide_num in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {slide_num + 1}: {random_sentence(rng, 3, 6)}"
+        slide.placeholders[1].text = "\n".join(random_sentence(rng) for _ in range(4))
+        for i in range(images_per_slide):
+            slide.shapes.add_picture(io.BytesIO(text_image_bytes(rng)), Inches(1 + i), Inches(4.5), width=Inches(4))
+        if repeated_logo:
+            slide.shapes.add_picture(io.BytesIO(logo), Inches(8), Inches(0.2), width=Inches(1.5))
+    prs.save(path)
+    return path
+
+def make_site(directory, pages=5, images_per_page=10, paragraphs=20, seed=0):
+    """
+    Write static HTML articles and their images. Returns the page file names.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for page_num in range(pages):
+        images = []
+        for i in range(images_per_page):
+            name = f"p{page_num}_img{i}.png"
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(text_image_bytes(rng))
+            images.append(f'<img src="{name}">')
+        body = "".join(f"<p>{random_paragraph(rng)}</p>" for _ in range(paragraphs))
+        html = (
+            f"<html><head><title>Article {page_num}</title></head><body>"
+            f"<article><h1>Article {page_num}</h1>{body}{''.join(images)}</article>"
+            "</body></html>"
+        )
+        name = f"article_{page_num}.html"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        names.append(name)
+    return names
+
+def make_fixtures(directory, size=1.0, image_density=1, seed=0):
+    """
+    Generate one PDF, DOCX and PPTX plus a static site. size scales page /
+    paragraph / slide counts; image_density is images per page or slide.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = [
+        make_pdf(os.path.join(directory, "handbook.pdf"), pages=max(1, int(40 * size)), images_per_page=image_density, seed=seed),
+        make_docx(os.path.join(directory, "notes.docx"), paragraphs=max(1, int(80 * size)), images=int(10 * size * image_density), seed=seed),
+        make_pptx(os.path.join(directory, "deck.pptx"), slides=max(1, int(30 * size)), images_per_slide=image_density, seed=seed),
+    ]
+    site_dir = os.path.join(directory, "site")
+    pages = make_site(site_dir, pages=max(1, int(5 * size)), images_per_page=5 * image_density, seed=seed)
+    return files, site_dir, pages
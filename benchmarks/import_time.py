@@ -0,0 +1,85 @@
+"""
+Startup benchmark: how long `import main` and `main.py --help` take.
+
+Each measurement runs in a fresh interpreter so nothing is already
+imported. The slowest modules come from `python -X importtime`:
+
+    python -m benchmarks.import_time --repeats 5 --max-ms 300
+
+With --max-ms the exit status is 1 when the median import time of main
+exceeds the limit, so a heavy top-level import is caught in CI.
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_timed(args, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+def parse_importtime(stderr):
+    """
+    (cumulative microseconds, module) for every line of -X importtime output.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if cumulative_us.strip().isdigit():
+            modules.append((int(cumulative_us), name.strip()))
+    return modules
+
+def measure(repeats, top):
+    env = dict(os.environ)
+    # The OpenAI client is created lazily, but keep the key set so a
+    # regression that builds it at import time is still measured, not crashed
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+    import_times, help_times = [], []
+    for _ in range(repeats):
+        import_times.append(run_timed(["-c", "import main"], env)[0])
+        help_times.append(run_timed(["main.py", "--help"], env)[0])
+    baseline = statistics.median(run_timed(["-c", "pass"], env)[0] for _ in range(repeats))
+
+    _, stderr = run_timed(["-X", "importtime", "-c", "import main"], env)
+    modules = sorted(parse_importtime(stderr), reverse=True)
+
+    return {
+        "interpreter_ms": round(baseline * 1000, 1),
+        "import_main_ms": round(statistics.median(import_times) * 1000, 1),
+        "help_ms": round(statistics.median(help_times) * 1000, 1),
+        "slowest_modules": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in modules[:top]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup time of main.py")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument("--max-ms", type=float, help="Fail when importing main takes longer than this (median)")
+    args = parser.parse_args()
+
+    report = measure(args.repeats, args.top)
+    print(f"Interpreter start:     {report['interpreter_ms']:8.1f} ms")
+    print(f"import main:           {report['import_main_ms']:8.1f} ms")
+    print(f"python main.py --help: {report['help_ms']:8.1f} ms")
+    print("\nSlowest imports (cumulative):")
+    for entry in report["slowest_modules"]:
+        print(f"  {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
+
+    if args.max_ms is not None and report["import_main_ms"] > args.max_ms:
+        print(f"\n❌ import main took {report['import_main_ms']} ms, limit is {args.max_ms} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
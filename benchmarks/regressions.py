@@ -0,0 +1,352 @@
+"""
+Regression checks for bugs fixed after review. The repo has no test
+suite, so each scenario is a small script that fails loudly if the bug
+comes back:
+
+    python -m benchmarks.regressions            # every check
+    python -m benchmarks.regressions pool batch # only these
+
+Nothing leaves the machine: the OpenAI client, process pool and HTTP
+servers are faked or local, caches live in a temporary directory and OCR
+is simulated. The exit status is 1 when any check fails.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import traceback
+from types import SimpleNamespace
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHECKS = {}
+
+def check(name):
+    def register(func):
+        CHECKS[name] = func
+        return func
+    return register
+
+# ---------- FAKES ----------
+class BreakingExecutor:
+    """
+    Runs jobs inline and raises BrokenProcessPool on the break_on-th submit,
+    like a pool whose worker died.
+    """
+
+    def __init__(self, break_on):
+        self.break_on = break_on
+        self.submits = 0
+
+    def submit(self, func, job):
+        from concurrent.futures.process import BrokenProcessPool
+        self.submits += 1
+        if self.submits >= self.break_on:
+            raise BrokenProcessPool("worker died")
+        future = Future()
+        try:
+            future.set_result(func(job))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+class FakeBatchClient:
+    """
+    Minimal OpenAI client for run_batch_job and cached_chat_completion.
+    batch_statuses gives the final status of each submitted batch in turn
+    ("completed" once they run out); failing_ids are custom_ids whose
+    request fails inside an otherwise completed batch.
+    """
+
+    def __init__(self, batch_statuses=(), failing_ids=()):
+        self.batch_statuses = list(batch_statuses)
+        self.failing_ids = set(failing_ids)
+        self.submitted = []
+        self.online_calls = 0
+        self._inputs = {}
+        self._batches = {}
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    def _upload(self, file, purpose):
+        file_id = f"file-{len(self._inputs)}"
+        self._inputs[file_id] = file[1].read().decode("utf-8")
+        return SimpleNamespace(id=file_id)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{len(self.submitted)}"
+        status = self.batch_statuses.pop(0) if self.batch_statuses else "completed"
+        self._batches[batch_id] = (input_file_id, status)
+        self.submitted.append(batch_id)
+        return SimpleNamespace(id=batch_id, status="validating")
+
+    def _retrieve(self, batch_id):
+        input_file_id, status = self._batches[batch_id]
+        output = f"out-{input_file_id}" if status == "completed" else None
+        return SimpleNamespace(id=batch_id, status=status, output_file_id=output, error_file_id=None)
+
+    def _content(self, file_id):
+        lines = []
+        for line in self._inputs[file_id[len("out-"):]].splitlines():
+            custom_id = json.loads(line)["custom_id"]
+            if custom_id in self.failing_ids:
+                response = {"status_code": 500, "body": {"error": {"message": "server error"}}}
+            else:
+                response = {"status_code": 200, "body": {
+                    "model": "gpt-4o-mini",
+                    "choices": [{"message": {"content": f"summary of {custom_id}"}}],
+                }}
+            lines.append(json.dumps({"custom_id": custom_id, "response": response}))
+        return SimpleNamespace(text="\n".join(lines))
+
+    def _chat(self, **params):
+        self.online_calls += 1
+        message = SimpleNamespace(content="online summary")
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+
+def use_fake_client(client):
+    import feedback_summary
+    feedback_summary.get_client = lambda: client
+
+def start_server(handler_class):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _fail_with_missing_file(job):
+    raise FileNotFoundError(job)
+
+# ---------- CHECKS ----------
+@check("pool")
+def check_pool_breaks_mid_stream():
+    """
+    A pool that breaks on the third submit still yields every result, and
+    an exception raised by a job reaches the caller instead of counting
+    as a broken pool.
+    """
+    from scripts import worker_pool
+
+    original = worker_pool.get_process_pool
+    try:
+        worker_pool.get_process_pool = lambda max_workers=None: BreakingExecutor(break_on=3)
+        results = list(worker_pool.imap_on_pool(lambda job: job * 10, range(6), prefetch=2))
+        assert results == [0, 10, 20, 30, 40, 50], results
+        assert worker_pool.map_on_pool(lambda job: job + 1, [1, 2, 3, 4]) == [2, 3, 4, 5]
+
+        worker_pool.get_process_pool = lambda max_workers=None: BreakingExecutor(break_on=100)
+        try:
+            list(worker_pool.imap_on_pool(_fail_with_missing_file, ["a.pdf", "b.pdf"]))
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("a job's FileNotFoundError was swallowed")
+    finally:
+        worker_pool.get_process_pool = original
+
+@check("batch")
+def check_batch_resubmission():
+    """
+    A batch that ended failed is submitted again on the next run; a request
+    failing inside a completed batch is retried online and a rerun only
+    submits what is still missing; an empty cohort submits nothing.
+    """
+    from feedback_summary import build_summary_request, summarize_chunks_batch
+    from scripts.batch_jobs import run_batch_job
+
+    client = FakeBatchClient(batch_statuses=["failed"])
+    requests = {"job-0": build_summary_request(["resumed job"], "student")}
+    first = run_batch_job(client, requests, job_name="regression")
+    assert isinstance(first["job-0"], Exception)
+    second = run_batch_job(client, requests, job_name="regression")
+    assert len(client.submitted) == 2, "the failed batch was resumed instead of submitted again"
+    assert second["job-0"] == "summary of job-0", second
+
+    client = FakeBatchClient(batch_statuses=["failed"])
+    use_fake_client(client)
+    chunks = [["first run failed batch"], ["another comment"]]
+    first = summarize_chunks_batch(chunks, "resubmit")
+    assert len(client.submitted) == 1
+    # The failed batch's requests are retried online
+    assert first == ["online summary", "online summary"], first
+    client.online_calls = 0
+
+    client = FakeBatchClient(failing_ids={"partial-0"})
+    use_fake_client(client)
+    chunks = [["one group fails"], ["one group succeeds"]]
+    summaries = summarize_chunks_batch(chunks, "partial")
+    assert summaries == ["online summary", "summary of partial-1"], summaries
+    assert client.online_calls == 1
+    again = summarize_chunks_batch(chunks, "partial")
+    assert again == summaries, again
+    assert len(client.submitted) == 1, "a rerun resubmitted groups that were already answered"
+
+    assert summarize_chunks_batch([], "empty") == []
+    assert len(client.submitted) == 1, "an empty cohort submitted a batch"
+
+@check("extraction-key")
+def check_extraction_key_follows_triage():
+    """
+    A file cached with IMAGE_TRIAGE on misses the extraction cache once
+    triage is turned off, then hits again.
+    """
+    from benchmarks.fixtures import make_docx
+    from scripts import image_triage
+    from scripts.extraction_cache import extraction_cache_stats, iter_extract_cached
+
+    path = make_docx(os.path.join(tempfile.mkdtemp(), "triage.docx"), paragraphs=6, images=2)
+    original = image_triage.IMAGE_TRIAGE
+    try:
+        image_triage.IMAGE_TRIAGE = True
+        list(iter_extract_cached(path))
+        list(iter_extract_cached(path))
+        before = extraction_cache_stats()
+        image_triage.IMAGE_TRIAGE = False
+        list(iter_extract_cached(path))
+        after = extraction_cache_stats()
+        assert after["misses"] == before["misses"] + 1, "IMAGE_TRIAGE=0 was served the triaged extraction"
+        list(iter_extract_cached(path))
+        assert extraction_cache_stats()["hits"] == after["hits"] + 1
+    finally:
+        image_triage.IMAGE_TRIAGE = original
+
+@check("ocr-reuse")
+def check_similar_images_not_shared():
+    """
+    Two slides on the same template with different text are OCR'd
+    separately; only identical bytes share a result.
+    """
+    import random
+    from benchmarks.fixtures import text_image_bytes
+    from scripts.ocr_utils import ocr_images_from_bytes
+
+    rng = random.Random(0)
+    first = text_image_bytes(rng, label="Quarterly revenue grew 12 percent")
+    second = text_image_bytes(rng, label="Quarterly revenue grew 17 percent")
+    texts = ocr_images_from_bytes([first, second, first], max_workers=1)
+    assert texts[0] == texts[2]
+    assert texts[0] != texts[1], "a similar image reused another image's OCR text"
+
+@check("clustering")
+def check_clusters_keep_numbers_and_modifiers():
+    """
+    Comments that differ in a number or a modifier stay apart; comments
+    that differ only in case and punctuation are merged.
+    """
+    from scripts.clustering import cluster_texts
+
+    for pair in [
+        ("Rated 5 out of 5", "Rated 1 out of 5"),
+        ("The pace was too fast", "The pace was fast"),
+        ("The session should be longer", "The session was longer"),
+    ]:
+        clusters = cluster_texts(list(pair))
+        assert len(clusters) == 2, f"{pair} were grouped together"
+    clusters = cluster_texts(["Great session!", "great session"])
+    assert len(clusters) == 1 and clusters[0]["size"] == 2
+
+@check("compress")
+def check_compression_never_empty():
+    """
+    Material without usable sentences (a sheet export, one long
+    unpunctuated paragraph) still fills the budget.
+    """
+    from scripts.compress import compress_segments
+    from scripts.tokens import count_tokens
+
+    sheet = "\n".join(f"{i}\t{i * 3}\tok" for i in range(3000))
+    paragraph = " ".join(f"word{i}" for i in range(3000))
+    for material in (sheet, paragraph):
+        kept = compress_segments([material], 500)
+        tokens = sum(count_tokens(segment) for segment in kept)
+        assert kept and 0 < tokens <= 500, (len(kept), tokens)
+
+@check("download-slot")
+def check_download_slot_released_while_waiting():
+    """
+    A download waiting out a Retry-After does not hold the concurrency slot:
+    another download finishes first.
+    """
+    from scripts import downloads
+
+    class Handler(BaseHTTPRequestHandler):
+        limited = 0
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/limited" and Handler.limited == 0:
+                Handler.limited += 1
+                self.send_response(429)
+                self.send_header("Retry-After", "2")
+                self.end_headers()
+                return
+            body = b"%PDF" * 1024
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server, base_url = start_server(Handler)
+    original = downloads._semaphore
+    downloads._semaphore = threading.BoundedSemaphore(1)
+    try:
+        finished = {}
+        started = time.monotonic()
+
+        def fetch(name):
+            downloads.download(f"{base_url}/{name}", revalidate=False)
+            finished[name] = time.monotonic() - started
+
+        limited = threading.Thread(target=fetch, args=("limited",))
+        limited.start()
+        time.sleep(0.3)
+        fetch("other")
+        limited.join()
+        assert finished["other"] < 1.5, f"other download waited {finished['other']:.1f}s for the slot"
+
+        path = downloads.download_to_file(f"{base_url}/file", suffix=".pdf")
+        try:
+            assert os.path.getsize(path) == 4096
+        finally:
+            os.remove(path)
+    finally:
+        downloads._semaphore = original
+        server.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run regression checks for fixed bugs.")
+    parser.add_argument("checks", nargs="*", metavar="CHECK", help=f"Subset of {sorted(CHECKS)}")
+    args = parser.parse_args(argv)
+    unknown = set(args.checks) - set(CHECKS)
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+
+    # Caches and batch state are read from the environment at import time
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="kv_regressions_")
+    os.environ.setdefault("OPENAI_API_KEY", "regressions")
+    os.environ.setdefault("BATCH_POLL_SECONDS", "0")
+    from benchmarks.run import use_simulated_ocr
+    use_simulated_ocr(0.0)
+
+    failed = []
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name]()
+        except Exception:
+            failed.append(name)
+            print(f"❌ {name}\n{traceback.format_exc()}")
+        else:
+            print(f"✅ {name}")
+    if failed:
+        print(f"\n{len(failed)} of {len(args.checks or CHECKS)} checks failed: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+End-to-end benchmark of the ingestion and analysis pipeline.
+
+Generates synthetic PDF / DOCX / PPTX files and a static website, serves
+the site and a mock OpenAI API locally, then times each stage:
+
+    python -m benchmarks.run --size 1 --image-density 2 --llm-latency 0.5
+
+Nothing leaves the machine. Caches live in a temporary directory and are
+cleared between repeats unless --warm is given. When Tesseract is not
+installed, OCR is simulated with a fixed per-image delay (--ocr-latency).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+
+from benchmarks.fixtures import make_fixtures, text_image_bytes
+from benchmarks.servers import start_static_server
+
+STAGES = ["extract", "ocr", "url", "analysis", "session"]
+
+SIMULATED_OCR_SECONDS = 0.05
+
+def simulated_ocr(image_bytes, lang=None, config=None):
+    time.sleep(SIMULATED_OCR_SECONDS)
+    return f"simulated text for {len(image_bytes)} bytes"
+
+def use_simulated_ocr(seconds):
+    """
+    Replace the Tesseract call with a fixed delay. Pool workers are forked
+    after this runs, so they see the replacement too.
+    """
+    global SIMULATED_OCR_SECONDS
+    import scripts.ocr_utils as ocr_utils
+    SIMULATED_OCR_SECONDS = seconds
+    ocr_utils._run_ocr = simulated_ocr
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def peak_rss_mb():
+    """
+    Peak RSS of this process, and of the largest child that has exited and
+    been waited for. Live pool workers are not included in the latter; see
+    live_worker_peak_rss_mb.
+    """
+    # ru_maxrss is in KiB on Linux
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return self_kb / 1024, children_kb / 1024
+
+def live_worker_peak_rss_mb():
+    """
+    Largest peak RSS (VmHWM) among the shared pool's running workers, read
+    from /proc. None when there is no pool or /proc is unavailable.
+    """
+    from scripts import worker_pool
+    processes = getattr(worker_pool._executor, "_processes", None) or {}
+    peaks = []
+    for pid in list(processes):
+        try:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    return max(peaks) if peaks else None
+
+def measure(name, jobs, run_job, repeats, reset, quiet=True):
+    """
+    Run run_job(job) for every job, repeats times. run_job returns the
+    number of units (pages, images, requests) it processed. Returns a dict
+    of latency percentiles, throughput and peak traced memory.
+    """
+    latencies = []
+    units = 0
+    tracemalloc.start()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        for _ in range(repeats):
+            reset()
+            for job in jobs:
+                job_started = time.perf_counter()
+                with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+                    units += run_job(job) or 0
+                latencies.append(time.perf_counter() - job_started)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "stage": name,
+        "jobs": len(latencies),
+        "units": units,
+        "seconds": round(elapsed, 3),
+        "units_per_second": round(units / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+        "peak_traced_mb": round(peak / 1024 / 1024, 1),
+    }
+
+def print_report(results):
+    header = f"{'stage':<10}{'jobs':>6}{'units':>8}{'sec':>9}{'units/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['stage']:<10}{r['jobs']:>6}{r['units']:>8}{r['seconds']:>9}{r['units_per_second']:>10}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['max_ms']:>10}{r['peak_traced_mb']:>9}"
+        )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic inputs.")
+    parser.add_argument("--size", type=float, default=1.0, help="Scale factor for pages, slides and paragraphs")
+    parser.add_argument("--image-density", type=int, default=1, help="Images per page / slide")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per mock chat completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--http-latency", type=float, default=0.0, help="Seconds per static site request")
+    parser.add_argument("--ocr-latency", type=float, default=None,
+                        help="Simulate OCR with this delay per image (default: only when Tesseract is missing)")
+    parser.add_argument("--warm", action="store_true", help="Keep caches between repeats")
+    parser.add_argument("--fixtures-dir", help="Keep generated fixtures here instead of a temporary directory")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own progress output")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+
+    workdir = tempfile.mkdtemp(prefix="kv_bench_")
+    fixtures_dir = args.fixtures_dir or os.path.join(workdir, "fixtures")
+    print(f"🏗️ Generating fixtures in {fixtures_dir}")
+    files, site_dir, pages = make_fixtures(fixtures_dir, args.size, args.image_density, args.seed)
+
+    from scripts.mock_openai import start_mock_server
+    api_server, api_url = start_mock_server(latency=args.llm_latency, jitter=args.llm_jitter)
+    site_server, site_url = start_static_server(site_dir, latency=args.http_latency)
+
+    # Configuration is read at import time, so set it before the pipeline modules load
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["OPENAI_BASE_URL"] = api_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from scripts.file_processing import iter_extract_from_file
+    from scripts.ocr_utils import get_ocr_cache, ocr_images_from_bytes
+    from scripts.url_processing import extract_content_from_url
+    from scripts.analysis import analyze_training_material_with_gpt
+    from scripts.llm_cache import set_llm_cache_enabled, get_llm_cache
+    from scripts.chunk_store import get_chunk_store
+    from scripts.extraction_cache import get_extraction_cache
+    import main as pipeline
+
+    if args.ocr_latency is not None or not shutil.which("tesseract"):
+        seconds = 0.05 if args.ocr_latency is None else args.ocr_latency
+        print(f"🧪 Simulating OCR at {seconds * 1000:.0f} ms per image")
+        use_simulated_ocr(seconds)
+
+    def reset():
+        if args.warm:
+            return
+        get_ocr_cache().clear()
+        get_llm_cache().clear()
+        get_chunk_store().clear()
+        get_extraction_cache().clear()
+
+    set_llm_cache_enabled(True)
+    page_urls = [f"{site_url}/{page}" for page in pages]
+    rng = random.Random(args.seed)
+    images = [text_image_bytes(rng) for _ in range(max(1, int(50 * args.size)))]
+    texts = {}
+
+    def run_extract(path):
+        records = list(iter_extract_from_file(path))
+        texts[path] = "\n\n".join(r["text"] for r in records if r["text"])
+        return len(records)
+
+    def run_ocr(batch):
+        return len(ocr_images_from_bytes(batch))
+
+    def run_url(url):
+        result = extract_content_from_url(url)
+        return 1 + len(result["images"]) if result else 0
+
+    def run_analysis(path):
+        if path not in texts:
+            run_extract(path)
+        before = api_server.state.request_count
+        analyze_training_material_with_gpt(texts[path], session_title="Benchmark")
+        return api_server.state.request_count - before
+
+    def run_session(inputs):
+        before = api_server.state.request_count
+        pipeline.analyze_session(inputs, "Benchmark", "Synthetic benchmark session")
+        return api_server.state.request_count - before
+
+    plan = {
+        "extract": (files, run_extract),
+        "ocr": ([images], run_ocr),
+        "url": (page_urls, run_url),
+        "analysis": (files, run_analysis),
+        "session": ([files + page_urls], run_session),
+    }
+
+    results = []
+    try:
+        for stage in stages:
+            jobs, run_job = plan[stage]
+            print(f"⏱️ Running stage: {stage}")
+            results.append(measure(stage, jobs, run_job, args.repeats, reset, quiet=not args.verbose))
+    finally:
+        api_server.shutdown()
+        site_server.shutdown()
+
+    print()
+    print_report(results)
+    self_mb, children_mb = peak_rss_mb()
+    workers_mb = live_worker_peak_rss_mb()
+    workers_text = f"{workers_mb:.0f} MB" if workers_mb is not None else "n/a"
+    print(
+        f"\n📈 Peak RSS: {self_mb:.0f} MB (main process), {workers_text} (largest live pool worker), "
+        f"{children_mb:.0f} MB (largest exited child)"
+    )
+    print(f"📡 Mock API requests: {api_server.state.request_count}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "args": vars(args),
+                "stages": results,
+                "peak_rss_mb": {
+                    "main": round(self_mb, 1),
+                    "live_workers": round(workers_mb, 1) if workers_mb is not None else None,
+                    "exited_children": round(children_mb, 1),
+                },
+            }, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+    if not args.fixtures_dir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import time
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+class StaticSiteHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+def start_static_server(directory, host="127.0.0.1", port=0, latency=0.0):
+    """
+    Serve the generated HTML pages and images from directory in a
+    background thread. Returns (server, base_url); call server.shutdown()
+    to stop it.
+    """
+    handler = type("Handler", (StaticSiteHandler,), {"latency": latency})
+    server = ThreadingHTTPServer((host, port), partial(handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
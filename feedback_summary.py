@@ -1,53 +1,133 @@
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import logging
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from scripts.llm_cache import cached_chat_completion, get_client, lookup_chat_completion, store_chat_completion
+from scripts.summarize import SUMMARY_INPUT_TOKENS, pack_by_tokens, reduce_to_one, tree_summarize
+from scripts.batch_jobs import run_batch_job
+from scripts.clustering import cluster_texts
+from scripts.telemetry import configure_logging, incr
+from scripts.config import env_flag
 
-def chunk_list(lst, chunk_size=10):
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i + chunk_size]
+log = logging.getLogger(__name__)
 
-def summarize_chunk(feedback_chunk, role_name):
+load_dotenv()
+
+# Set FEEDBACK_CLUSTERING=0 to summarize every comment instead of one per group of similar comments
+FEEDBACK_CLUSTERING = env_flag("FEEDBACK_CLUSTERING", True)
+# Other distinct wordings quoted for a group besides its representative comment
+FEEDBACK_CLUSTER_SAMPLES = int(os.getenv("FEEDBACK_CLUSTER_SAMPLES", "2"))
+
+def cluster_feedback(feedback_list, role_name):
+    """
+    Replace groups of comments that make the same point with one line:
+    the group's most typical comment, its size and a few other wordings.
+    Largest groups come first, so the number of summary calls follows the
+    number of distinct themes rather than the number of comments.
+    """
+    clusters = cluster_texts(feedback_list)
+    points = []
+    for cluster in clusters:
+        representative = feedback_list[cluster["representative"]].strip()
+        if cluster["size"] == 1:
+            points.append(representative)
+            continue
+        samples, seen = [], {representative.lower()}
+        for index in cluster["members"]:
+            text = feedback_list[index].strip()
+            if len(samples) >= FEEDBACK_CLUSTER_SAMPLES:
+                break
+            if text.lower() not in seen:
+                seen.add(text.lower())
+                samples.append(text)
+        point = f"[{cluster['size']} comments] {representative}"
+        if samples:
+            point += " (also: " + "; ".join(f'"{sample}"' for sample in samples) + ")"
+        points.append(point)
+
+    incr("feedback_comments_total", len(feedback_list), role=role_name)
+    incr("feedback_points_total", len(points), role=role_name)
+    log.info(f"🧮 Grouped {len(feedback_list)} {role_name} comments into {len(points)} points")
+    return points
+
+def build_summary_request(feedback_chunk, role_name):
     text = "\n- ".join(feedback_chunk)
     prompt = f"""
-You are an expert analyst. Summarize the following {role_name} feedback points into a concise paragraph:
+You are an expert analyst. Summarize the following {role_name} feedback points into a concise paragraph.
+A point starting with "[N comments]" stands for N comments making that point; weigh it accordingly.
 
 - {text}
 """
-    response = client.chat.completions.create(
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.5,
+        "max_tokens": 1000,
+    }
+
+def summarize_chunk(feedback_chunk, role_name):
+    return cached_chat_completion(get_client(), **build_summary_request(feedback_chunk, role_name))
+
+def summarize_chunks_batch(feedback_chunks, role_name):
+    # Summarize many feedback batches through the OpenAI batch interface.
+    # Groups already answered are served from the LLM cache, so a rerun only
+    # submits what is still missing (and therefore a new job).
+    summaries = [None] * len(feedback_chunks)
+    requests = {}
+    for i, chunk in enumerate(feedback_chunks):
+        request = build_summary_request(chunk, role_name)
+        cached = lookup_chat_completion(**request)
+        if cached is not None:
+            summaries[i] = cached
+        else:
+            requests[f"{role_name}-{i}"] = request
+
+    log.info(f"📦 {len(requests)} of {len(feedback_chunks)} {role_name} feedback groups need summarizing")
+    results = run_batch_job(get_client(), requests, job_name="feedback") if requests else {}
+    for custom_id, result in results.items():
+        i = int(custom_id.rsplit("-", 1)[1])
+        if isinstance(result, Exception):
+            log.warning(f"⚠️ Batch summary {custom_id} failed ({result}), retrying interactively")
+            summaries[i] = summarize_chunk(feedback_chunks[i], role_name)
+            continue
+        request = requests[custom_id]
+        store_chat_completion(request["model"], request["messages"], result,
+                              temperature=request["temperature"], max_tokens=request["max_tokens"])
+        summaries[i] = result
+    return summaries
+
+def summarize_summaries(summaries, role_name):
+    combined_text = "\n- ".join(summaries)
+    prompt = f"""
+You are an expert analyst. Summarize the following summarized {role_name} feedback points into a concise paragraph:
+
+- {combined_text}
+"""
+    return cached_chat_completion(
+        get_client(),
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.5,
         max_tokens=1000
     )
-    return response.choices[0].message.content.strip()
-
-def hierarchical_summarize(feedback_list, role_name):
-    # Step 1 & 2: Chunk & summarize each chunk
-    chunk_summaries = []
-    for chunk in chunk_list(feedback_list, chunk_size=10):
-        summary = summarize_chunk(chunk, role_name)
-        chunk_summaries.append(summary)
-    
-    # Step 3 & 4: Summarize combined chunk summaries if more than 1 chunk
-    if len(chunk_summaries) == 1:
-        return chunk_summaries[0]
-    else:
-        combined_text = "\n- ".join(chunk_summaries)
-        prompt = f"""
-You are an expert analyst. Summarize the following summarized {role_name} feedback points into a concise paragraph:
 
-- {combined_text}
-"""
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content.strip()
+def hierarchical_summarize(feedback_list, role_name, batch=False):
+    # Level 0 summarizes raw feedback in token-budgeted batches; higher levels
+    # summarize the summaries until one remains. Each level runs concurrently.
+    if FEEDBACK_CLUSTERING:
+        feedback_list = cluster_feedback(feedback_list, role_name)
+
+    def summarize_group(group, level):
+        if level == 0:
+            return summarize_chunk(group, role_name)
+        return summarize_summaries(group, role_name)
+
+    if batch:
+        # The bulk first level goes through the batch interface; the few
+        # remaining levels run interactively
+        summaries = summarize_chunks_batch(pack_by_tokens(feedback_list, SUMMARY_INPUT_TOKENS), role_name)
+        return reduce_to_one(summaries, summarize_group)
+    return tree_summarize(feedback_list, summarize_group)
 
 def final_combined_analysis(student_summary, trainer_summary):
     prompt = f"""
@@ -64,19 +144,19 @@ Please provide:
 1. An integrated analysis highlighting the overall perfomance of trainers and the quality of sessions.
 2. For each student analyze the feedback given by trainers and moderators and give analysis on how the student can improve where his weakness and strength lies.
 """
-    response = client.chat.completions.create(
+    return cached_chat_completion(
+        get_client(),
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
         max_tokens=1000
     )
-    return response.choices[0].message.content.strip()
 
 # Putting it all together
 
-def analyze_large_feedback(student_feedback, trainer_moderator_feedback):
-    student_summary = hierarchical_summarize(student_feedback, "student")
-    trainer_summary = hierarchical_summarize(trainer_moderator_feedback, "trainer and moderator")
+def analyze_large_feedback(student_feedback, trainer_moderator_feedback, batch=False):
+    student_summary = hierarchical_summarize(student_feedback, "student", batch=batch)
+    trainer_summary = hierarchical_summarize(trainer_moderator_feedback, "trainer and moderator", batch=batch)
 
     final_report = final_combined_analysis(student_summary, trainer_summary)
     return final_report
@@ -84,17 +164,20 @@ def analyze_large_feedback(student_feedback, trainer_moderator_feedback):
 
 # Example usage
 
-student_feedback = [
-    # large list of student feedback strings
-    'The session was great',
-    'The session was fun.'
-]
+if __name__ == "__main__":
+    configure_logging()
+
+    student_feedback = [
+        # large list of student feedback strings
+        'The session was great',
+        'The session was fun.'
+    ]
 
-trainer_moderator_feedback = [
-    # large list of trainer/mod feedback strings
-    'The student was great'
-    'The student was an idiot'
-]
+    trainer_moderator_feedback = [
+        # large list of trainer/mod feedback strings
+        'The student was great'
+        'The student was an idiot'
+    ]
 
-report = analyze_large_feedback(student_feedback, trainer_moderator_feedback)
-print(report)
+    report = analyze_large_feedback(student_feedback, trainer_moderator_feedback)
+    print(report)
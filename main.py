@@ -1,88 +1,208 @@
 import os
 import sys
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
+from scripts.llm_cache import set_llm_cache_enabled, llm_cache_stats
+from scripts.telemetry import configure_logging, in_current_scope, span, start_metrics_server, summary, write_trace
 
-from scripts.file_processing import extract_from_file
-from scripts.analysis import analyze_training_material_with_gpt
-from scripts.url_processing import extract_content_from_url
-from scripts.google_url_processing import identify_google_service,google_to_pdf
+# Extractors, OCR, Selenium and the OpenAI client are imported where they are
+# first needed, so `--help` and single-format runs only load what they use.
 
+log = logging.getLogger(__name__)
 
+# Number of inputs fetched and extracted at the same time
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+
+# Optional metadata
+DEFAULT_SESSION_TITLE = "MACHINE LEARNING"
+DEFAULT_SESSION_DESCRIPTION = "This session is for LLMS for students who are already familiar with basics."
 
 def handle_file(file_path):
-    print(f"\n📄 Processing file: {file_path}")
-    text, images = extract_from_file(file_path)
-    ocr_texts = [img['ocr_text'] for img in images if img['ocr_text']]
-    return text, ocr_texts
+    from scripts.extraction_cache import iter_extract_cached
+
+    log.info(f"📄 Processing file: {file_path}")
+    # Records arrive page by page without image payloads, so memory stays bounded
+    texts = []
+    ocr_texts = []
+    with span("extract.file", path=file_path, format=os.path.splitext(file_path)[-1].lower()) as attrs:
+        records = 0
+        # Unchanged files are served from the extraction cache without parsing or OCR
+        for record in iter_extract_cached(file_path):
+            records += 1
+            if record['text']:
+                texts.append(record['text'])
+            ocr_texts.extend(record['ocr_texts'])
+        attrs.update(records=records, ocr_texts=len(ocr_texts))
+    return "\n\n".join(texts), ocr_texts
 
 def handle_url(url):
+    from scripts.url_processing import extract_content_from_url
+
     result = extract_content_from_url(url)
     if result is None:
         return "", []
     # Extract what you want from dict:
     text = result.get("text", "")
     images = result.get("images", [])
-    return text, images
-
-
-def analyze_session(inputs, session_title=None, session_description=None):
-    all_text = ""
-    all_ocr_texts = []
-    temp_files_to_delete = []
-
-    for input_path in inputs:
-        if input_path.startswith("http"):
-            service_type = identify_google_service(input_path)
-            if service_type in {"docs", "sheets", "slides"}:
-                print(f"📄 Detected Google {service_type} link. Downloading as PDF...")
-                saved_pdf_path = google_to_pdf(input_path)
-                print(f"SAVED PATH : {saved_pdf_path}")
-                if saved_pdf_path:
-                    text, ocrs = handle_file(saved_pdf_path)
-                    temp_files_to_delete.append(saved_pdf_path)  # Track for deletion
-                else:
-                    print(f"⚠️ Failed to download Google file: {input_path}")
-                    continue
-            else:
-                text, ocrs = handle_url(input_path)
-        elif os.path.isfile(input_path):
-            text, ocrs = handle_file(input_path)
-        else:
-            print(f"⚠️ Skipping invalid input: {input_path}")
-            continue
-
-        all_text += f"\n\n{text}"
-        all_ocr_texts.extend(ocrs)
-
-    print("\n🤖 Generating GPT analysis...\n")
-    feedback = analyze_training_material_with_gpt(
-        text=all_text,
-        images_ocr_texts=all_ocr_texts,
-        session_title=session_title,
-        session_description=session_description,
-    )
-
-    print("📝 === Feedback Report ===\n")
-    print(feedback)
-
-    # 🧹 Clean up temporary files
-    for file_path in temp_files_to_delete:
-        try:
-            os.remove(file_path)
-            print(f"🧹 Deleted temporary file: {file_path}")
-        except Exception as e:
-            print(f"⚠️ Failed to delete {file_path}: {e}")
+    ocr_texts = [img['alt_or_ocr'] for img in images if img['alt_or_ocr']]
+    return text, ocr_texts
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python main.py <file_or_url1> <file_or_url2> ...")
-        sys.exit(1)
 
-    # Optional metadata
-    session_title = "MACHINE LEARNING"
-    session_description = "This session is for LLMS for students who are already familiar with basics."
+def handle_google(url):
+    from scripts.google_url_processing import extract_google_content
 
-    inputs = sys.argv[1:]
-    analyze_session(inputs, session_title, session_description)
+    # Native exports (txt / xlsx / pptx) first, PDF only as a fallback
+    log.info(f"📄 Detected Google document link. Fetching native export...")
+    result = extract_google_content(url)
+    if result is None:
+        log.warning(f"⚠️ Failed to download Google file: {url}")
+    return result
+
+# Input kind -> handler returning (text, ocr_texts) or None
+SOURCE_HANDLERS = {
+    "google": handle_google,
+    "web": handle_url,
+    "file": handle_file,
+}
+
+def source_kind(input_path):
+    if input_path.startswith("http"):
+        from scripts.google_url_processing import is_google_document
+        return "google" if is_google_document(input_path) else "web"
+    if os.path.isfile(input_path):
+        return "file"
+    return None
+
+def load_input(input_path):
+    """
+    Fetch and extract one input. Returns (text, ocr_texts), or None when
+    the input is skipped.
+    """
+    kind = source_kind(input_path)
+    if kind is None:
+        log.warning(f"⚠️ Skipping invalid input: {input_path}")
+        return None
+    with span("input", source=input_path, kind=kind):
+        return SOURCE_HANDLERS[kind](input_path)
+
+def iter_input_segments(inputs, max_workers=None, dedup=None):
+    """
+    Fetch and extract all inputs concurrently, yielding each source's text
+    and OCR text as soon as that source (and every input before it) has
+    finished. Keeping input order makes chunk boundaries, and therefore
+    cached feedback, stable between runs. With a Deduplicator, paragraphs
+    already seen in an earlier input (or earlier in the same one, or in
+    its slide text for OCR) are left out.
+    """
+    max_workers = max_workers or INGEST_WORKERS
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(in_current_scope(load_input), input_path) for input_path in inputs]
+        for input_path, future in zip(inputs, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                log.warning(f"⚠️ Failed to process {input_path}: {e}")
+                continue
+            if result is None:
+                continue
+
+            text, ocrs = result
+            if dedup is not None:
+                with span("dedup", source=input_path) as attrs:
+                    dropped = len(dedup.duplicates)
+                    text = dedup.filter(text, input_path)
+                    ocrs = [ocr for ocr in (dedup.filter(ocr, f"{input_path} (images)") for ocr in ocrs) if ocr]
+                    attrs["dropped"] = len(dedup.duplicates) - dropped
+            if text:
+                yield text
+            if ocrs:
+                yield "Image Content:\n" + "\n\n".join(ocrs)
+
+
+def analyze_session(inputs, session_title=None, session_description=None, batch=False, trace_file=None, token_budget=None, report=True):
+    from scripts.analysis import analyze_training_material_stream
+    from scripts.dedup import DEDUP, Deduplicator
+
+    # Duplicate paragraphs across inputs are dropped before chunking so they cost no tokens
+    dedup = Deduplicator() if DEDUP else None
+    # Chunks are handed to the analysis pool while remaining inputs are still being extracted
+    log.info("🤖 Generating GPT analysis...")
+    with span("session", inputs=len(inputs), batch=batch, token_budget=token_budget):
+        feedback = analyze_training_material_stream(
+            iter_input_segments(inputs, dedup=dedup),
+            session_title=session_title,
+            session_description=session_description,
+            batch=batch,
+            token_budget=token_budget,
+        )
+
+    # The service records usage per job instead; the process-wide numbers mix concurrent jobs
+    if report:
+        print("📝 === Feedback Report ===\n")
+        print(feedback)
+
+        print_cache_report()
+        if dedup is not None:
+            print_dedup_report(dedup.report())
+        llm = summary()["llm"]
+        print(
+            f"💰 LLM usage: {llm['calls']} calls, {llm['prompt_tokens']} prompt + "
+            f"{llm['completion_tokens']} completion tokens, ~${llm['estimated_cost_usd']:.4f}"
+        )
+        write_trace(trace_file)
+
+    return feedback
+
+def print_cache_report():
+    from scripts.extraction_cache import extraction_cache_stats
+    from scripts.ocr_utils import ocr_cache_stats
+    from scripts.chunk_store import chunk_store_stats
+    from scripts.image_triage import triage_stats
+
+    stats = extraction_cache_stats()
+    print(f"\n🗂️ Extraction cache: {stats['hits']} hits, {stats['misses']} misses")
+    stats = ocr_cache_stats()
+    print(f"🗂️ OCR cache: {stats['hits']} hits, {stats['misses']} misses")
+    stats = llm_cache_stats()
+    print(f"🗂️ LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    stats = chunk_store_stats()
+    print(f"♻️ Reused chunk feedback: {stats['hits']} chunks, {stats['misses']} analyzed")
+    print(f"🖼️ Image triage: {triage_stats()}")
+
+def print_dedup_report(report):
+    print(f"🧹 Duplicate paragraphs: {report['dropped']} dropped (~{report['dropped_tokens']} tokens), {report['kept']} kept")
+    for entry in report["sources"]:
+        print(f"   {entry['source']} repeats {entry['kept_source']}: {entry['paragraphs']} paragraphs, ~{entry['tokens']} tokens")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate training material (files, web pages, Google Docs/Sheets/Slides) against a session topic.",
+    )
+    parser.add_argument("inputs", nargs="*", metavar="FILE_OR_URL", help="PDF/DOCX/PPTX files or URLs")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache and always call the API")
+    parser.add_argument("--batch", action="store_true", help="Send chunk analysis through the OpenAI batch interface (offline runs)")
+    parser.add_argument("--budget", type=int, metavar="TOKENS", help="Compress the material to about this many tokens before analysis (caps cost for large inputs)")
+    parser.add_argument("--trace", metavar="FILE", help="Write a JSON trace of spans, token usage and cache hit rates")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve Prometheus metrics while the session runs")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived service that takes jobs over HTTP")
+    parser.add_argument("--port", type=int, help="Port for --serve")
+    args = parser.parse_args(argv)
+    if not args.serve and not args.inputs:
+        parser.error("at least one FILE_OR_URL is required (or --serve)")
+    return args
 
-        
+if __name__ == "__main__":
+    args = parse_args()
+    configure_logging()
+
+    if args.no_cache:
+        set_llm_cache_enabled(False)
+    if args.serve:
+        from scripts.service import serve
+        serve(port=args.port)
+        sys.exit(0)
+
+    start_metrics_server(args.metrics_port)
+    analyze_session(args.inputs, DEFAULT_SESSION_TITLE, DEFAULT_SESSION_DESCRIPTION, batch=args.batch, trace_file=args.trace, token_budget=args.budget)
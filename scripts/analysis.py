@@ -1,18 +1,108 @@
 import os
-from openai import OpenAI
+import logging
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from scripts.llm_cache import cached_chat_completion, get_client, llm_cache_enabled, store_chat_completion
+from scripts.batch_jobs import run_batch_job
+from scripts.chunk_store import chunk_fingerprint, get_chunk_store
+from scripts.summarize import reduce_until_fits
+from scripts.text_utils import PARAGRAPH_BREAK
+from scripts.tokens import count_tokens, split_tokens, tail_tokens
+from scripts.telemetry import in_current_scope, incr, span
+
+log = logging.getLogger(__name__)
+
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Split long text into chunks of N words
-def chunk_text(text, max_words=1500):
-    words = text.split()
-    for i in range(0, len(words), max_words):
-        yield " ".join(words[i:i + max_words])
+# Maximum number of chunk analysis requests in flight at once
+ANALYSIS_MAX_CONCURRENCY = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "8"))
+# Token budget for each chunk, and how much of the previous chunk is repeated at the start of the next
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "8000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "200"))
+# Once a chunk holds this share of the budget it may end early at a content-defined cut point
+CHUNK_MIN_FILL = float(os.getenv("CHUNK_MIN_FILL", "0.75"))
+# Material beyond this many tokens is compressed extractively before chunking (0 = no limit)
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
 
-# Analyze a single chunk with session focus
-def analyze_chunk(chunk_text, chunk_num, session_topic):
+def iter_paragraphs(text):
+    start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        paragraph = text[start:match.start()].strip()
+        if paragraph:
+            yield paragraph
+        start = match.end()
+    paragraph = text[start:].strip()
+    if paragraph:
+        yield paragraph
+
+# Yield (piece, token_count) units of at most max_tokens, preferring paragraph, then line boundaries
+def iter_text_units(text, max_tokens):
+    for paragraph in iter_paragraphs(text):
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            tokens = count_tokens(line)
+            if tokens <= max_tokens:
+                yield line, tokens
+                continue
+            for piece in split_tokens(line, max_tokens):
+                yield piece, count_tokens(piece)
+
+# Content-defined cut point: depends only on the unit itself, so editing one
+# slide does not shift every later chunk boundary (and fingerprint) with it
+def is_content_boundary(piece, tokens, max_tokens):
+    spread = max(1.0, max_tokens * (1 - CHUNK_MIN_FILL) / 2)
+    return zlib.crc32(piece.encode("utf-8")) / 2**32 < tokens / spread
+
+# Pack a stream of text segments into chunks up to a token budget. Chunks are
+# yielded as soon as they are complete, so segments can arrive while earlier
+# chunks are already being analyzed.
+def chunk_segments(segments, max_tokens=None, overlap_tokens=None):
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    if overlap_tokens is None:
+        overlap_tokens = CHUNK_OVERLAP_TOKENS
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 4))
+    min_fill_tokens = max_tokens * CHUNK_MIN_FILL
+
+    current, current_tokens, has_new_text = [], 0, False
+    for segment in segments:
+        for piece, tokens in iter_text_units(segment, max_tokens - overlap_tokens):
+            # +1 for the blank line joining units
+            if has_new_text and current_tokens + tokens + 1 > max_tokens:
+                chunk = "\n\n".join(current)
+                yield chunk
+                overlap = tail_tokens(chunk, overlap_tokens)
+                current = [overlap] if overlap else []
+                current_tokens = count_tokens(overlap)
+            current.append(piece)
+            current_tokens += tokens + 1
+            has_new_text = True
+
+            if current_tokens >= min_fill_tokens and is_content_boundary(piece, tokens, max_tokens):
+                chunk = "\n\n".join(current)
+                yield chunk
+                overlap = tail_tokens(chunk, overlap_tokens)
+                current = [overlap] if overlap else []
+                current_tokens = count_tokens(overlap)
+                has_new_text = False
+
+    if has_new_text:
+        yield "\n\n".join(current)
+
+# Split long text into chunks packed up to a token budget, streaming as it goes
+def chunk_text(text, max_tokens=None, overlap_tokens=None):
+    return chunk_segments([text], max_tokens, overlap_tokens)
+
+# Build the chat completion request for a single chunk
+def build_chunk_request(chunk_text, chunk_num, session_topic):
     prompt = f"""
 You are reviewing part {chunk_num} of a training session titled: "{session_topic}".
 
@@ -27,35 +117,114 @@ Provide a concise evaluation focusing on:
 4. ✅ Suggestions to enhance engagement or practical understanding.
 """
 
-    response = client.chat.completions.create(
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a professional training material evaluator AI. Focus strictly on analyzing the uploaded material and give improvement suggestions."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.4,
+    }
+
+# Analyze a single chunk with session focus
+def analyze_chunk(chunk_text, chunk_num, session_topic):
+    return cached_chat_completion(get_client(), **build_chunk_request(chunk_text, chunk_num, session_topic))
+
+# Analyze one chunk, turning failures into an error entry for the report.
+# Chunks whose fingerprint was analyzed before reuse the stored feedback.
+def analyze_chunk_safe(chunk, chunk_num, session_topic):
+    store = get_chunk_store() if llm_cache_enabled() else None
+    fingerprint = chunk_fingerprint(chunk, session_topic)
+    stored = store.get(fingerprint) if store else None
+    if stored is not None:
+        log.info(f"♻️ Reusing stored feedback for chunk {chunk_num}")
+        incr("analysis_chunks_total", result="reused")
+        return f"🧩 Feedback for part {chunk_num}:\n{stored.decode('utf-8')}"
+
+    log.info(f"🧠 Analyzing chunk {chunk_num}...")
+    try:
+        with span("analysis.chunk", chunk=chunk_num, tokens=count_tokens(chunk)):
+            feedback = analyze_chunk(chunk, chunk_num, session_topic)
+    except Exception as e:
+        incr("analysis_chunks_total", result="error")
+        return f"❌ Error in chunk {chunk_num}: {str(e)}"
+    incr("analysis_chunks_total", result="analyzed")
+    if store:
+        store.set(fingerprint, feedback.encode("utf-8"))
+    return f"🧩 Feedback for part {chunk_num}:\n{feedback}"
+
+# Analyze chunks with a bounded number of concurrent requests, keeping chunk order.
+# Chunks may be a generator: each one is submitted as soon as it is produced.
+def analyze_chunks(chunks, session_topic, max_concurrency=None):
+    max_concurrency = max_concurrency or ANALYSIS_MAX_CONCURRENCY
+    if max_concurrency <= 1:
+        return [analyze_chunk_safe(chunk, i + 1, session_topic) for i, chunk in enumerate(chunks)]
+
+    analyze = in_current_scope(analyze_chunk_safe)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [
+            executor.submit(analyze, chunk, i + 1, session_topic)
+            for i, chunk in enumerate(chunks)
+        ]
+        return [future.result() for future in futures]
+
+# Analyze chunks through the OpenAI batch interface: slower to complete but suited
+# to bulk offline runs. Job state is kept on disk so an interrupted run resumes.
+def analyze_chunks_batch(chunks, session_topic):
+    chunks = list(chunks)
+    store = get_chunk_store() if llm_cache_enabled() else None
+    feedbacks = [None] * len(chunks)
+    requests = {}
+    for i, chunk in enumerate(chunks):
+        stored = store.get(chunk_fingerprint(chunk, session_topic)) if store else None
+        if stored is not None:
+            feedbacks[i] = f"🧩 Feedback for part {i + 1}:\n{stored.decode('utf-8')}"
+        else:
+            requests[f"chunk-{i + 1}"] = build_chunk_request(chunk, i + 1, session_topic)
+
+    log.info(f"📦 {len(requests)} of {len(chunks)} chunks need analysis")
+    results = run_batch_job(get_client(), requests, job_name="analysis") if requests else {}
+    for custom_id, result in results.items():
+        chunk_num = int(custom_id.split("-")[1])
+        if isinstance(result, Exception):
+            feedbacks[chunk_num - 1] = f"❌ Error in chunk {chunk_num}: {str(result)}"
+            continue
+        request = requests[custom_id]
+        store_chat_completion(request["model"], request["messages"], result, temperature=request["temperature"])
+        if store:
+            store.set(chunk_fingerprint(chunks[chunk_num - 1], session_topic), result.encode("utf-8"))
+        feedbacks[chunk_num - 1] = f"🧩 Feedback for part {chunk_num}:\n{result}"
+    return feedbacks
+
+# Condense a group of chunk feedbacks when there are too many for one combine call
+def condense_feedback(feedbacks, session_title):
+    prompt = f"""
+The following is feedback on consecutive parts of a training session titled "{session_title}":
+
+{chr(10).join(feedbacks)}
+
+Condense it into one shorter feedback section. Keep every concrete issue, missing topic and suggestion; drop repetition.
+"""
+
+    return cached_chat_completion(
+        get_client(),
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "content": "You are a professional training material evaluator AI. Focus strictly on analyzing the uploaded material and give improvement suggestions."},
+            {"role": "system", "content": "You are a training program evaluator AI. Focus on topic alignment and material completeness."},
             {"role": "user", "content": prompt}
         ],
         temperature=0.4,
     )
-    return response.choices[0].message.content.strip()
-
-# Analyze all content in chunks and summarize
-def analyze_training_material_with_gpt(text, images_ocr_texts=None, session_title=None, session_description=None):
-    print("🔍 Chunking training material...")
-    full_text = f"Session Title: {session_title}\nDescription: {session_description}\n{text}"
-    ocr_text = "\n".join(images_ocr_texts or [])
-    combined = full_text + "\n\nImage Content:\n" + ocr_text
 
-    chunks = list(chunk_text(combined, max_words=1500))
-    feedbacks = []
+# Combine per-chunk feedback into the final evaluation
+def combine_feedback(feedbacks, session_title):
+    # Tree-reduce the feedback first if it would overflow a single combine call
+    with span("analysis.condense", feedbacks=len(feedbacks)):
+        feedbacks = reduce_until_fits(
+            feedbacks,
+            lambda group, level: condense_feedback(group, session_title),
+        )
 
-    for i, chunk in enumerate(chunks):
-        print(f"🧠 Analyzing chunk {i + 1}/{len(chunks)}...")
-        try:
-            feedback = analyze_chunk(chunk, i + 1, session_title)
-            feedbacks.append(f"🧩 Feedback for part {i + 1}:\n{feedback}")
-        except Exception as e:
-            feedbacks.append(f"❌ Error in chunk {i + 1}: {str(e)}")
-
-    # Combine feedbacks
     final_prompt = f"""
 The following is feedback across parts of a training session titled "{session_title}":
 
@@ -67,13 +236,45 @@ Now:
 - Suggest specific content, examples, or sections that could be added to enhance quality.
 """
 
-    final_response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a training program evaluator AI. Focus on topic alignment and material completeness."},
-            {"role": "user", "content": final_prompt}
-        ],
-        temperature=0.4,
-    )
+    with span("analysis.combine", feedbacks=len(feedbacks)):
+        return cached_chat_completion(
+            get_client(),
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a training program evaluator AI. Focus on topic alignment and material completeness."},
+                {"role": "user", "content": final_prompt}
+            ],
+            temperature=0.4,
+        )
+
+# Analyze text segments as they arrive (e.g. one per finished input) and summarize.
+# With a token budget the whole material is collected first and compressed to fit it.
+def analyze_training_material_stream(segments, session_title=None, session_description=None, max_concurrency=None, batch=False, token_budget=None):
+    token_budget = SESSION_TOKEN_BUDGET if token_budget is None else token_budget
+    if token_budget:
+        from scripts.compress import compress_segments
+        segments = compress_segments(list(segments), token_budget, topic=f"{session_title}\n{session_description}")
+
+    log.info("🔍 Chunking training material...")
+    header = f"Session Title: {session_title}\nDescription: {session_description}"
+    chunks = chunk_segments(itertools.chain([header], segments))
 
-    return final_response.choices[0].message.content.strip()
+    if batch:
+        feedbacks = analyze_chunks_batch(chunks, session_title)
+    else:
+        feedbacks = analyze_chunks(chunks, session_title, max_concurrency=max_concurrency)
+    log.info(f"🧩 Analyzed {len(feedbacks)} chunks")
+    return combine_feedback(feedbacks, session_title)
+
+# Analyze all content in chunks and summarize
+def analyze_training_material_with_gpt(text, images_ocr_texts=None, session_title=None, session_description=None, max_concurrency=None, batch=False, token_budget=None):
+    ocr_text = "\n\n".join(images_ocr_texts or [])
+    segments = [text, "Image Content:\n" + ocr_text]
+    return analyze_training_material_stream(
+        segments,
+        session_title=session_title,
+        session_description=session_description,
+        max_concurrency=max_concurrency,
+        batch=batch,
+        token_budget=token_budget,
+    )
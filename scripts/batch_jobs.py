@@ -0,0 +1,168 @@
+import os
+import logging
+import io
+import json
+import time
+import hashlib
+
+from scripts.disk_cache import CACHE_DIR
+from scripts.telemetry import incr, record_usage, span
+
+log = logging.getLogger(__name__)
+
+# Where job files and resumable job state are kept
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(CACHE_DIR, "batches"))
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch statuses after which polling stops
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def build_batch_lines(requests_by_id):
+    """
+    requests_by_id maps a custom_id to a chat completion request body
+    (model, messages, temperature, ...). Returns the JSONL job text.
+    """
+    lines = [
+        json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": body,
+        }, ensure_ascii=False)
+        for custom_id, body in requests_by_id.items()
+    ]
+    return "\n".join(lines) + "\n"
+
+def _state_path(job_id):
+    return os.path.join(BATCH_DIR, f"{job_id}.json")
+
+def load_batch_state(job_id):
+    try:
+        with open(_state_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"job_id": job_id, "status": "new"}
+
+def save_batch_state(state):
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    path = _state_path(state["job_id"])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def parse_batch_output(content):
+    """
+    Map each custom_id in a batch output file to its completion text, or
+    to an Exception describing why that request failed.
+    """
+    results = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record["custom_id"]
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or response.get("body", {}).get("error")
+            results[custom_id] = RuntimeError(f"Batch request failed: {error}")
+            continue
+        results[custom_id] = response["body"]["choices"][0]["message"]["content"].strip()
+    return results
+
+def record_batch_usage(content):
+    """
+    Count the requests, tokens and estimated cost of a batch output file.
+    """
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        body = (json.loads(line).get("response") or {}).get("body") or {}
+        if body.get("usage"):
+            incr("llm_requests_total", model=body.get("model"), mode="batch")
+            record_usage(body.get("model"), body["usage"], batch=True)
+
+def run_batch_job(client, requests_by_id, job_name="batch", poll_seconds=None):
+    """
+    Submit chat completion requests through the OpenAI batch interface,
+    poll until the batch finishes and return {custom_id: text or Exception}.
+
+    The job file and its state are stored under BATCH_DIR, keyed by a hash
+    of the requests, so re-running after an interruption resumes polling
+    the already-submitted batch instead of submitting it again.
+    """
+    poll_seconds = BATCH_POLL_SECONDS if poll_seconds is None else poll_seconds
+    job_text = build_batch_lines(requests_by_id)
+    job_id = f"{job_name}_{hashlib.sha256(job_text.encode('utf-8')).hexdigest()[:16]}"
+    state = load_batch_state(job_id)
+
+    if state.get("status") == "completed" and "results_file" in state:
+        log.info(f"📦 Batch {job_id} already completed, loading stored results")
+        with open(state["results_file"], encoding="utf-8") as f:
+            return parse_batch_output(f.read())
+
+    if state.get("batch_id") and state.get("status") in TERMINAL_STATUSES - {"completed"}:
+        # A failed / expired / cancelled batch is submitted again, not resumed
+        log.info(f"📦 Previous batch {state['batch_id']} ended {state['status']}, resubmitting")
+        state["previous_batch_id"] = state.pop("batch_id")
+        state.pop("status")
+
+    if not state.get("batch_id"):
+        os.makedirs(BATCH_DIR, exist_ok=True)
+        job_file = os.path.join(BATCH_DIR, f"{job_id}.jsonl")
+        with open(job_file, "w", encoding="utf-8") as f:
+            f.write(job_text)
+
+        uploaded = client.files.create(
+            file=(os.path.basename(job_file), io.BytesIO(job_text.encode("utf-8"))),
+            purpose="batch",
+        )
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        state.update({
+            "job_file": job_file,
+            "input_file_id": uploaded.id,
+            "batch_id": batch.id,
+            "status": batch.status,
+            "request_count": len(requests_by_id),
+        })
+        save_batch_state(state)
+        log.info(f"📦 Submitted batch {batch.id} with {len(requests_by_id)} requests")
+    else:
+        log.info(f"📦 Resuming batch {state['batch_id']} ({state.get('status')})")
+
+    with span("llm.batch_wait", job=job_id, requests=len(requests_by_id)):
+        while True:
+            batch = client.batches.retrieve(state["batch_id"])
+            if batch.status != state.get("status"):
+                state["status"] = batch.status
+                save_batch_state(state)
+                log.info(f"📦 Batch {batch.id}: {batch.status}")
+            if batch.status in TERMINAL_STATUSES:
+                break
+            time.sleep(poll_seconds)
+
+    file_ids = [batch.output_file_id, getattr(batch, "error_file_id", None)]
+    output = "\n".join(client.files.content(file_id).text for file_id in file_ids if file_id)
+    record_batch_usage(output)
+    results = parse_batch_output(output)
+
+    results_file = os.path.join(BATCH_DIR, f"{job_id}.results.jsonl")
+    with open(results_file, "w", encoding="utf-8") as f:
+        f.write(output)
+    if batch.status == "completed":
+        state["results_file"] = results_file
+    else:
+        # Forget the batch so the next run submits a new one
+        state["previous_batch_id"] = state.pop("batch_id")
+        state.pop("status", None)
+    save_batch_state(state)
+
+    # Requests missing from the output (expired / cancelled batches) are reported as errors
+    for custom_id in requests_by_id:
+        results.setdefault(custom_id, RuntimeError(f"No result in batch ({batch.status})"))
+    return results
@@ -0,0 +1,144 @@
+import os
+import logging
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+
+log = logging.getLogger(__name__)
+
+# Number of headless Chrome instances kept alive
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+# A driver is recycled after this many pages to keep Chrome's memory in check
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+# Upper bound on how long a page may take to become ready
+PAGE_LOAD_TIMEOUT = float(os.getenv("PAGE_LOAD_TIMEOUT", "15"))
+# The network counts as idle once no new resources were requested for this long
+NETWORK_IDLE_MS = int(os.getenv("NETWORK_IDLE_MS", "500"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def create_driver():
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-gpu")
+    # Return from driver.get() at DOMContentLoaded; readiness is awaited explicitly
+    options.page_load_strategy = "eager"
+
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    return driver
+
+# ---------- READINESS-BASED WAIT ----------
+def wait_until_ready(driver, timeout=PAGE_LOAD_TIMEOUT, idle_ms=NETWORK_IDLE_MS):
+    """
+    Wait until the document has finished loading and no new network
+    resources have been requested for idle_ms, or until timeout seconds
+    have passed. Returns True when the page settled before the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+    except TimeoutException:
+        return False
+
+    idle_seconds = idle_ms / 1000
+    last_count = -1
+    last_change = time.monotonic()
+    while time.monotonic() < deadline:
+        count = driver.execute_script("return performance.getEntriesByType('resource').length")
+        now = time.monotonic()
+        if count != last_count:
+            last_count = count
+            last_change = now
+        elif now - last_change >= idle_seconds:
+            return True
+        time.sleep(0.1)
+    return False
+
+# ---------- POOL OF LONG-LIVED DRIVERS ----------
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+class DriverPool:
+    """
+    Pool of long-lived headless Chrome drivers. Drivers are checked out per
+    URL, returned afterwards, and replaced after max_pages pages or when
+    they crash.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES):
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    @contextmanager
+    def driver(self):
+        self._slots.acquire()
+        pooled = None
+        try:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = _PooledDriver(create_driver())
+
+            try:
+                yield pooled.driver
+            except WebDriverException:
+                # The browser may have crashed; never hand it out again
+                self._discard(pooled)
+                pooled = None
+                raise
+
+            pooled.pages += 1
+            if self._closed or pooled.pages >= self.max_pages:
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+            pooled = None
+        finally:
+            if pooled is not None:
+                self._discard(pooled)
+            self._slots.release()
+
+    def _discard(self, pooled):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            log.warning(f"⚠️ Failed to quit browser: {e}")
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+def get_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+        return _pool
+
+def close_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+atexit.register(close_driver_pool)
@@ -0,0 +1,30 @@
+import os
+import re
+import hashlib
+import threading
+
+from scripts.disk_cache import DiskCache
+
+# Per-chunk feedback kept for incremental re-analysis of edited materials
+CHUNK_STORE_MAX_MB = int(os.getenv("CHUNK_STORE_MAX_MB", "128"))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_chunk_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DiskCache("chunk_feedback", max_bytes=CHUNK_STORE_MAX_MB * 1024 * 1024)
+    return _store
+
+def normalize_chunk(chunk):
+    # Whitespace-only differences (re-exports, re-flowed text) keep the same fingerprint
+    return re.sub(r"\s+", " ", chunk).strip()
+
+def chunk_fingerprint(chunk, session_title):
+    payload = f"{session_title}\n{normalize_chunk(chunk)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def chunk_store_stats():
+    return get_chunk_store().stats()
@@ -0,0 +1,122 @@
+import os
+import re
+import numpy as np
+
+from scripts.text_features import FUNCTION_WORDS, tfidf_matrix
+from scripts.text_utils import normalize_text
+from scripts.telemetry import span
+
+# Cosine similarity of TF-IDF vectors above which two texts join the same cluster
+CLUSTER_THRESHOLD = float(os.getenv("CLUSTER_THRESHOLD", "0.8"))
+# Texts compared against the existing clusters in one sparse matrix product
+CLUSTER_BATCH_SIZE = int(os.getenv("CLUSTER_BATCH_SIZE", "1024"))
+
+NUMBER = re.compile(r"\b\d+(?:[.,]\d+)?\b")
+
+def normalized_key(text):
+    # Only case and punctuation are ignored: "Rated 5" and "Rated 1", or
+    # "too fast" and "fast", are different comments
+    return normalize_text(text) or text.strip().lower()
+
+def leader_clusters(matrix, threshold, batch_size):
+    """
+    Single-pass threshold clustering: each row joins the cluster of the
+    most similar leader at or above threshold, or becomes a new leader.
+    Rows are compared in batches, against earlier leaders with one sparse
+    product and against leaders from the same batch one by one.
+    Returns the cluster label of every row.
+    """
+    labels = np.full(matrix.shape[0], -1, dtype=np.int64)
+    leaders = []
+    for start in range(0, matrix.shape[0], batch_size):
+        batch = matrix[start:start + batch_size]
+        if leaders:
+            similarity = (batch @ matrix[leaders].T).tocsr()
+            # Only matches above the threshold matter; dropping the rest keeps argmax cheap
+            similarity.data[similarity.data < threshold] = 0
+            similarity.eliminate_zeros()
+            best = np.asarray(similarity.argmax(axis=1)).ravel()
+            best_similarity = similarity.max(axis=1).toarray().ravel()
+        else:
+            best = np.zeros(batch.shape[0], dtype=np.int64)
+            best_similarity = np.zeros(batch.shape[0])
+        within = (batch @ batch.T).toarray()
+
+        # Rows of the batch that became leaders; the others are masked out below
+        is_leader = np.zeros(batch.shape[0], dtype=bool)
+        for offset in range(batch.shape[0]):
+            label, label_similarity = -1, threshold
+            if best_similarity[offset] >= threshold:
+                label, label_similarity = best[offset], best_similarity[offset]
+            candidates = np.where(is_leader, within[offset], -1.0)
+            nearest = int(candidates.argmax())
+            if candidates[nearest] >= label_similarity:
+                label = labels[start + nearest]
+            if label < 0:
+                label = len(leaders)
+                leaders.append(start + offset)
+                is_leader[offset] = True
+            labels[start + offset] = label
+    return labels
+
+def central_member(matrix, members, weights):
+    """
+    The member whose vector is closest to the weighted mean of the cluster.
+    """
+    if len(members) == 1:
+        return members[0]
+    rows = matrix[members]
+    mean = np.asarray(rows.T @ np.asarray(weights, dtype=np.float32)).ravel()
+    return members[int(np.argmax(rows @ mean))]
+
+def cluster_texts(texts, threshold=None, batch_size=None):
+    """
+    Group texts that make the same point. Exact repeats (after lowercasing
+    and dropping punctuation) are merged first, then distinct texts that
+    quote the same numbers are clustered by TF-IDF cosine similarity.
+
+    Returns clusters as dicts with "members" (indices into texts, in input
+    order), "size" and "representative" (index of the most central member),
+    largest cluster first.
+    """
+    threshold = CLUSTER_THRESHOLD if threshold is None else threshold
+    batch_size = batch_size or CLUSTER_BATCH_SIZE
+    if not texts:
+        return []
+
+    with span("cluster", texts=len(texts)) as attrs:
+        # normalised text -> indices of its repeats
+        repeats = {}
+        for index, text in enumerate(texts):
+            repeats.setdefault(normalized_key(text), []).append(index)
+        groups = list(repeats.values())
+
+        # Numbers and modifiers such as "too" or "should" are features; only function words are not
+        matrix, _ = tfidf_matrix([texts[group[0]] for group in groups], stop_words=FUNCTION_WORDS)
+
+        # Texts quoting different numbers ("Rated 5 out of 5" / "Rated 1 out of 5")
+        # make different claims, so they are only clustered among themselves
+        partitions = {}
+        for group_index, group in enumerate(groups):
+            numbers = tuple(sorted(set(NUMBER.findall(texts[group[0]]))))
+            partitions.setdefault(numbers, []).append(group_index)
+
+        by_label = {}
+        for partition in partitions.values():
+            labels = leader_clusters(matrix[partition], threshold, batch_size)
+            for group_index, label in zip(partition, labels):
+                by_label.setdefault((partition[0], label), []).append(group_index)
+
+        clusters = []
+        for group_indices in by_label.values():
+            members = sorted(i for g in group_indices for i in groups[g])
+            # Each distinct text counts as often as it was repeated
+            central = central_member(matrix, group_indices, [len(groups[g]) for g in group_indices])
+            clusters.append({
+                "members": members,
+                "size": len(members),
+                "representative": groups[central][0],
+            })
+        clusters.sort(key=lambda c: (-c["size"], c["members"][0]))
+        attrs.update(distinct=len(groups), clusters=len(clusters))
+    return clusters
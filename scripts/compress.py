@@ -0,0 +1,159 @@
+import os
+import heapq
+import logging
+import numpy as np
+
+from scripts.text_utils import PARAGRAPH_BREAK
+from scripts.text_features import HASH_FEATURES, feature_id, row_dot, split_sentences, tfidf_matrix, words
+from scripts.tokens import count_tokens, split_tokens
+from scripts.telemetry import incr, span
+
+log = logging.getLogger(__name__)
+
+# Balance between relevance and novelty when picking sentences (1 = relevance only)
+COMPRESS_MMR_LAMBDA = float(os.getenv("COMPRESS_MMR_LAMBDA", "0.7"))
+# Weight of similarity to the session title and description, next to similarity to the whole material
+COMPRESS_TOPIC_WEIGHT = float(os.getenv("COMPRESS_TOPIC_WEIGHT", "0.5"))
+# Sentences with fewer content words than this are never picked on their own (page numbers, stray labels)
+COMPRESS_MIN_WORDS = int(os.getenv("COMPRESS_MIN_WORDS", "4"))
+
+def split_units(segments):
+    """
+    (segment index, paragraph index, sentence) for every sentence of every segment.
+    """
+    units = []
+    for segment_index, segment in enumerate(segments):
+        paragraphs = [p for p in PARAGRAPH_BREAK.split(segment) if p.strip()]
+        for paragraph_index, paragraph in enumerate(paragraphs):
+            for sentence in split_sentences(paragraph):
+                units.append((segment_index, paragraph_index, sentence))
+    return units
+
+def topic_vector(topic, idf):
+    vector = np.zeros(HASH_FEATURES, dtype=np.float32)
+    for word in words(topic or ""):
+        vector[feature_id(word)] += idf[feature_id(word)]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def sentence_relevance(matrix, idf, sentences, topic=None):
+    """
+    Cosine similarity of each sentence to the centroid of all sentences,
+    plus COMPRESS_TOPIC_WEIGHT times its similarity to the topic, scaled to [0, 1].
+    """
+    centroid = np.asarray(matrix.mean(axis=0), dtype=np.float32).ravel()
+    norm = np.linalg.norm(centroid)
+    relevance = matrix @ (centroid / norm) if norm else np.zeros(matrix.shape[0], dtype=np.float32)
+    if topic:
+        relevance = relevance + COMPRESS_TOPIC_WEIGHT * (matrix @ topic_vector(topic, idf))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    relevance[[len(words(s)) < COMPRESS_MIN_WORDS for s in sentences]] = 0.0
+    peak = relevance.max() if len(relevance) else 0.0
+    return relevance / peak if peak > 0 else relevance
+
+def select_sentences(sentences, token_budget=None, max_sentences=None, topic=None, mmr_lambda=None, tokens=None):
+    """
+    Pick the sentences that best cover the material within a token budget
+    and / or sentence count, by maximal marginal relevance: relevance to
+    the material and topic, minus overlap with what is already picked.
+    Overlap only grows as sentences are picked, so scores are recomputed
+    lazily (a heap of stale upper bounds). Returns indices in text order.
+    """
+    mmr_lambda = COMPRESS_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    if not sentences:
+        return []
+    matrix, idf = tfidf_matrix(sentences)
+    relevance = sentence_relevance(matrix, idf, sentences, topic)
+    if token_budget and tokens is None:
+        tokens = [count_tokens(s) for s in sentences]
+
+    # Element-wise maximum of the picked sentences' vectors
+    covered = np.zeros(HASH_FEATURES, dtype=np.float32)
+    heap = [(-mmr_lambda * relevance[i], i, 0) for i in range(len(sentences)) if relevance[i] > 0]
+    heapq.heapify(heap)
+    picked, used, epoch = [], 0, 0
+    while heap:
+        if max_sentences and len(picked) >= max_sentences:
+            break
+        score, i, scored_at = heapq.heappop(heap)
+        if tokens and used + tokens[i] > token_budget:
+            continue
+        if scored_at != epoch:
+            overlap = min(1.0, row_dot(matrix, i, covered))
+            heapq.heappush(heap, (-(mmr_lambda * relevance[i] - (1 - mmr_lambda) * overlap), i, epoch))
+            continue
+        picked.append(i)
+        used += tokens[i] if tokens else 0
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        np.maximum.at(covered, matrix.indices[start:end], matrix.data[start:end])
+        epoch += 1
+    return sorted(picked)
+
+def fill_in_order(sentences, tokens, token_budget, picked):
+    """
+    Add unpicked sentences to picked ({index: text}) in text order while
+    they fit in token_budget; the first one that does not fit is cut to
+    the remaining budget.
+    """
+    used = sum(tokens[i] for i in picked)
+    for i, sentence in enumerate(sentences):
+        remaining = token_budget - used
+        if remaining <= 0:
+            break
+        if i in picked:
+            continue
+        if tokens[i] > remaining:
+            picked[i] = split_tokens(sentence, remaining)[0]
+            break
+        picked[i] = sentence
+        used += tokens[i]
+    return picked
+
+def compress_segments(segments, token_budget, topic=None):
+    """
+    Shrink a list of text segments to about token_budget tokens by keeping
+    their most relevant, least redundant sentences in their original order
+    and paragraphs. Segments already within budget are returned unchanged.
+    A segment's short label line (e.g. "Image Content:") is kept with it.
+    """
+    segments = [s for s in segments if s and s.strip()]
+    units = split_units(segments)
+    sentences = [sentence for _, _, sentence in units]
+    tokens = [count_tokens(s) for s in sentences]
+    total = sum(tokens)
+    if total <= token_budget:
+        return segments
+
+    with span("compress", sentences=len(sentences), tokens=total, budget=token_budget) as attrs:
+        picked = {i: sentences[i] for i in select_sentences(sentences, token_budget=token_budget, topic=topic, tokens=tokens)}
+        if sum(tokens[i] for i in picked) < token_budget:
+            # What relevance leaves unused (short fragments such as table cells
+            # or OCR lines, or sentences longer than the budget) is filled with
+            # the material in text order, so the result is never empty
+            fill_in_order(sentences, tokens, token_budget, picked)
+        first_units = {}
+        for index, (segment_index, paragraph_index, sentence) in enumerate(units):
+            first_units.setdefault(segment_index, index)
+
+        for segment_index in {units[i][0] for i in picked}:
+            label = first_units[segment_index]
+            if units[label][2].endswith(":") and len(words(units[label][2])) < COMPRESS_MIN_WORDS:
+                picked.setdefault(label, units[label][2])
+
+        # segment -> paragraph -> picked sentences, all in text order
+        kept_segments = {}
+        for index in sorted(picked):
+            segment_index, paragraph_index, _ = units[index]
+            kept_segments.setdefault(segment_index, {}).setdefault(paragraph_index, []).append(picked[index])
+        compressed = ["\n\n".join("\n".join(p) for p in paragraphs.values()) for paragraphs in kept_segments.values()]
+
+        kept = sum(count_tokens(text) for text in picked.values())
+        attrs.update(kept_sentences=len(picked), kept_tokens=kept)
+    incr("compress_tokens_total", kept, result="kept")
+    incr("compress_tokens_total", total - kept, result="dropped")
+    log.info(f"✂️ Compressed material from {total} to {kept} tokens ({len(picked)} of {len(sentences)} sentences)")
+    return compressed
+
+def extractive_summary(text, max_sentences=3, topic=None):
+    sentences = split_sentences(text)
+    return " ".join(sentences[i] for i in select_sentences(sentences, max_sentences=max_sentences, topic=topic))
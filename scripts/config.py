@@ -0,0 +1,13 @@
+import os
+
+FALSE_VALUES = {"0", "false", "no", "off"}
+
+def env_flag(name, default):
+    """
+    Boolean setting from the environment: unset or empty gives default,
+    0 / false / no / off (any case) turn it off, anything else turns it on.
+    """
+    value = os.getenv(name, "").strip().lower()
+    if not value:
+        return default
+    return value not in FALSE_VALUES
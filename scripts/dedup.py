@@ -0,0 +1,159 @@
+import os
+import zlib
+import hashlib
+import logging
+import numpy as np
+
+from scripts.config import env_flag
+from scripts.text_utils import PARAGRAPH_BREAK, normalize_text
+from scripts.tokens import count_tokens
+from scripts.telemetry import incr
+
+log = logging.getLogger(__name__)
+
+# Set DEDUP=0 to send every paragraph to the analysis, duplicates included
+DEDUP = env_flag("DEDUP", True)
+# Estimated Jaccard similarity of word shingles above which two paragraphs count as the same
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# Paragraphs shorter than this (headings, "Thank you", page numbers) are always kept
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", "40"))
+# Words per shingle
+DEDUP_SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "3"))
+# MinHash signature length, split into LSH bands of equal size. 16 bands of
+# 8 rows make pairs above ~0.7 similarity very likely to share a band.
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+MINHASH_SEED = 1
+
+_rng = np.random.default_rng(MINHASH_SEED)
+# Multiply-shift hashing: ((a * x + b) mod 2**64) >> 32, one (a, b) per permutation
+_HASH_A = _rng.integers(1, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2**63, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+def shingles(normalized, size=None):
+    size = size or DEDUP_SHINGLE_WORDS
+    words = normalized.split()
+    if len(words) <= size:
+        return {normalized}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash_signature(shingle_set):
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+        dtype=np.uint64,
+        count=len(shingle_set),
+    )
+    permuted = (np.outer(hashes, _HASH_A) + _HASH_B) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def estimated_similarity(a, b):
+    return float(np.mean(a == b))
+
+class Deduplicator:
+    """
+    Drops paragraphs that repeat one seen earlier in the session, across
+    all inputs and their OCR text: exact copies by hash of the normalised
+    text, near copies by MinHash similarity found through an LSH index.
+    The first copy is kept; every dropped copy is recorded with the source
+    it came from and the source of the copy that was kept.
+    """
+
+    def __init__(self, threshold=None, min_chars=None):
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self.min_chars = DEDUP_MIN_CHARS if min_chars is None else min_chars
+        self.rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        # normalised text digest -> kept paragraph id
+        self._exact = {}
+        # (band, band bytes) -> kept paragraph ids
+        self._buckets = {}
+        self._signatures = []
+        self._sources = []
+        self.duplicates = []
+        self.kept = 0
+        self.dropped_tokens = 0
+
+    def _match(self, signature):
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            candidates.update(self._buckets.get(key, ()))
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = estimated_similarity(signature, self._signatures[candidate])
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None and best_similarity >= self.threshold:
+            return best, best_similarity
+        return None, best_similarity
+
+    def _add(self, digest, signature, source):
+        paragraph_id = len(self._signatures)
+        self._exact[digest] = paragraph_id
+        self._signatures.append(signature)
+        self._sources.append(source)
+        for band in range(LSH_BANDS):
+            key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            self._buckets.setdefault(key, []).append(paragraph_id)
+
+    def _record_duplicate(self, paragraph, source, kept_id, kind, similarity):
+        tokens = count_tokens(paragraph)
+        self.dropped_tokens += tokens
+        self.duplicates.append({
+            "source": source,
+            "kept_source": self._sources[kept_id],
+            "kind": kind,
+            "similarity": round(similarity, 3),
+            "tokens": tokens,
+            "preview": paragraph[:80],
+        })
+        incr("dedup_paragraphs_total", result=kind)
+        log.debug(f"🧹 {kind} duplicate from {source} (kept from {self._sources[kept_id]}): {paragraph[:60]!r}")
+
+    def is_duplicate(self, paragraph, source):
+        """
+        True when paragraph repeats one seen before; otherwise remember it
+        and return False.
+        """
+        if len(paragraph) < self.min_chars:
+            return False
+        normalized = normalize_text(paragraph)
+        digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+        kept_id = self._exact.get(digest)
+        if kept_id is not None:
+            self._record_duplicate(paragraph, source, kept_id, "exact", 1.0)
+            return True
+
+        signature = minhash_signature(shingles(normalized))
+        kept_id, similarity = self._match(signature)
+        if kept_id is not None:
+            self._record_duplicate(paragraph, source, kept_id, "near", similarity)
+            return True
+
+        self._add(digest, signature, source)
+        self.kept += 1
+        incr("dedup_paragraphs_total", result="kept")
+        return False
+
+    def filter(self, text, source):
+        """
+        Return text without the paragraphs already seen in this session.
+        """
+        paragraphs = [p.strip() for p in PARAGRAPH_BREAK.split(text) if p.strip()]
+        return "\n\n".join(p for p in paragraphs if not self.is_duplicate(p, source))
+
+    def report(self):
+        """
+        Dropped paragraphs and tokens, per (duplicate source, kept source) pair.
+        """
+        pairs = {}
+        for duplicate in self.duplicates:
+            key = (duplicate["source"], duplicate["kept_source"])
+            entry = pairs.setdefault(key, {"source": key[0], "kept_source": key[1], "paragraphs": 0, "tokens": 0})
+            entry["paragraphs"] += 1
+            entry["tokens"] += duplicate["tokens"]
+        return {
+            "kept": self.kept,
+            "dropped": len(self.duplicates),
+            "dropped_tokens": self.dropped_tokens,
+            "sources": sorted(pairs.values(), key=lambda e: -e["tokens"]),
+        }
@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import threading
+
+from scripts.telemetry import incr
+
+# Root folder for all on-disk caches
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+class DiskCache:
+    """
+    Small SQLite-backed key/value cache with size-bounded LRU eviction
+    and an optional time-to-live. Values are stored as bytes.
+    """
+
+    def __init__(self, name, max_bytes=256 * 1024 * 1024, ttl=None, cache_dir=None):
+        cache_dir = cache_dir or CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        self.name = name
+        self.path = os.path.join(cache_dir, f"{name}.sqlite3")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                incr("cache_lookups_total", cache=self.name, result="miss")
+                return None
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                incr("cache_lookups_total", cache=self.name, result="miss")
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            incr("cache_lookups_total", cache=self.name, result="hit")
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop expired entries first, then least recently used until under the size bound
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_used ASC")
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size,
+        }
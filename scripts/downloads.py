@@ -0,0 +1,213 @@
+import os
+import io
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.disk_cache import DiskCache
+from scripts.http_client import get_download_session, HTTP_TIMEOUT
+from scripts.telemetry import in_current_scope, incr, span
+
+log = logging.getLogger(__name__)
+
+# Downloads in flight at once across the whole process
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+# Attempts for rate-limited (429) or unavailable (503) responses
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "4"))
+DOWNLOAD_BACKOFF_SECONDS = float(os.getenv("DOWNLOAD_BACKOFF_SECONDS", "1"))
+# Longest Retry-After we are willing to honour before giving up
+DOWNLOAD_MAX_WAIT_SECONDS = float(os.getenv("DOWNLOAD_MAX_WAIT_SECONDS", "60"))
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+# Bodies kept for ETag / Last-Modified revalidation
+DOWNLOAD_CACHE_MAX_MB = int(os.getenv("DOWNLOAD_CACHE_MAX_MB", "256"))
+RETRY_STATUSES = {429, 503}
+
+_semaphore = threading.BoundedSemaphore(DOWNLOAD_CONCURRENCY)
+_cache = None
+_cache_lock = threading.Lock()
+
+class DownloadError(Exception):
+    def __init__(self, url, message, status=None, content_type=None):
+        super().__init__(f"{message}: {url}")
+        self.url = url
+        self.status = status
+        self.content_type = content_type
+
+def get_download_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache("downloads", max_bytes=DOWNLOAD_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+def retry_after_seconds(response, attempt):
+    """
+    Seconds to wait before retrying: the server's Retry-After (seconds or
+    an HTTP date) when given, else exponential backoff with jitter.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return DOWNLOAD_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+def _validators(url):
+    cache = get_download_cache()
+    meta = cache.get(f"meta:{url}")
+    if meta is None:
+        return {}, None
+    meta = json.loads(meta)
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers, meta
+
+def _remember(url, response, data):
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return
+    cache = get_download_cache()
+    cache.set(f"body:{url}", data)
+    cache.set(f"meta:{url}", json.dumps({
+        "etag": etag,
+        "last_modified": last_modified,
+        "content_type": response.headers.get("Content-Type", ""),
+    }).encode("utf-8"))
+
+def _stream_body(response, url, out, max_bytes):
+    written = 0
+    for block in response.iter_content(chunk_size=256 * 1024):
+        written += len(block)
+        if written > max_bytes:
+            raise DownloadError(url, f"Body exceeds {max_bytes} bytes", response.status_code)
+        out.write(block)
+    return written
+
+def _download_into(url, out, session, max_bytes, revalidate, reject_html):
+    """
+    Stream url into the binary file object out and return its content
+    type. See download() for the retry, size and revalidation rules.
+    """
+    headers, meta = _validators(url) if revalidate else ({}, None)
+
+    with span("download", url=url) as attrs:
+        for attempt in range(DOWNLOAD_MAX_RETRIES + 1):
+            wait = 0.0
+            try:
+                # A slot is held only while a request is open, never while waiting to retry
+                with _semaphore, session.get(url, headers=headers, timeout=HTTP_TIMEOUT, stream=True) as response:
+                    attrs["status"] = response.status_code
+                    if response.status_code == 304 and meta is not None:
+                        cached = get_download_cache().get(f"body:{url}")
+                        if cached is not None:
+                            incr("downloads_total", result="not_modified")
+                            attrs["bytes"] = len(cached)
+                            out.write(cached)
+                            return meta.get("content_type", "")
+                        # Local copy was evicted: ask again without validators
+                        headers = {}
+                        continue
+
+                    if response.status_code in RETRY_STATUSES and attempt < DOWNLOAD_MAX_RETRIES:
+                        wait = retry_after_seconds(response, attempt)
+                        if wait > DOWNLOAD_MAX_WAIT_SECONDS:
+                            raise DownloadError(url, f"Retry-After of {wait:.0f}s is too long", response.status_code)
+                        log.warning(f"⏳ HTTP {response.status_code}, retrying in {wait:.1f}s: {url}")
+                        incr("download_retries_total", status=response.status_code)
+                    else:
+                        content_type = response.headers.get("Content-Type", "")
+                        if response.status_code != 200:
+                            raise DownloadError(url, f"HTTP {response.status_code}", response.status_code, content_type)
+                        if reject_html and "text/html" in content_type.lower():
+                            raise DownloadError(url, "Got an HTML page instead of a file", response.status_code, content_type)
+
+                        declared = int(response.headers.get("Content-Length") or 0)
+                        if declared > max_bytes:
+                            raise DownloadError(url, f"Body of {declared} bytes exceeds {max_bytes}", response.status_code)
+                        # Drop whatever a failed earlier attempt wrote
+                        out.seek(0)
+                        out.truncate()
+                        attrs["bytes"] = _stream_body(response, url, out, max_bytes)
+                        if revalidate:
+                            out.seek(0)
+                            _remember(url, response, out.read())
+                        incr("downloads_total", result="downloaded")
+                        return content_type
+            except requests.RequestException as e:
+                if attempt >= DOWNLOAD_MAX_RETRIES:
+                    raise DownloadError(url, f"Request failed ({e})") from e
+                wait = DOWNLOAD_BACKOFF_SECONDS * (2 ** attempt)
+            time.sleep(wait)
+        raise DownloadError(url, "Gave up after retries")
+
+def download(url, session=None, max_bytes=None, revalidate=True, reject_html=False):
+    """
+    Download url into memory and return (bytes, content_type).
+
+    The body is streamed in blocks with a size cap. At most
+    DOWNLOAD_CONCURRENCY requests are open at once; a download waiting to
+    retry does not hold a slot. 429 / 503 responses are retried after the
+    server's Retry-After. When revalidate is set, a conditional request is
+    sent for URLs downloaded before and an unchanged (304) document is
+    served from the local copy. Raises DownloadError on failure. A session
+    passed in must not retry 429 / 503 itself (see
+    http_client.get_download_session).
+    """
+    buffer = io.BytesIO()
+    content_type = _download_into(
+        url, buffer, session or get_download_session(), max_bytes or DOWNLOAD_MAX_BYTES, revalidate, reject_html,
+    )
+    return buffer.getvalue(), content_type
+
+def download_to_file(url, directory=None, prefix="download_", suffix="", session=None, max_bytes=None,
+                     revalidate=False, reject_html=False):
+    """
+    Stream url in blocks to a new uniquely named file (so concurrent jobs
+    never share a path) and return its path. The caller deletes the file.
+    The body is not held in memory unless revalidate is set, which keeps
+    a copy in the download cache.
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            _download_into(
+                url, f, session or get_download_session(), max_bytes or DOWNLOAD_MAX_BYTES, revalidate, reject_html,
+            )
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def download_many(urls, max_workers=None, **kwargs):
+    """
+    Download several URLs concurrently. Returns a list in input order of
+    (bytes, content_type) or the DownloadError raised for that URL.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    def attempt(url):
+        try:
+            return download(url, **kwargs)
+        except DownloadError as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers or DOWNLOAD_CONCURRENCY, len(urls))) as executor:
+        return list(executor.map(in_current_scope(attempt), urls))
@@ -0,0 +1,134 @@
+import os
+import json
+import zlib
+import hashlib
+import logging
+import threading
+
+from scripts.config import env_flag
+from scripts.disk_cache import DiskCache
+from scripts import file_processing, image_triage, ocr_utils
+from scripts.file_processing import iter_extract_from_file
+from scripts.ocr_utils import ocr_failures_in_thread
+from scripts.telemetry import span
+
+log = logging.getLogger(__name__)
+
+# Bump when an extractor changes its output so older cache entries are ignored
+EXTRACTOR_VERSION = "2"
+# Set EXTRACTION_CACHE=0 to always re-extract files
+EXTRACTION_CACHE = env_flag("EXTRACTION_CACHE", True)
+EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "512"))
+
+_caches = {}
+_lock = threading.Lock()
+
+def _get_cache(name, max_bytes):
+    with _lock:
+        if name not in _caches:
+            _caches[name] = DiskCache(name, max_bytes=max_bytes)
+        return _caches[name]
+
+def get_extraction_cache():
+    return _get_cache("extraction", EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+
+def get_stat_index():
+    # path -> (size, mtime, digest), so unchanged files are not re-hashed
+    return _get_cache("extraction_index", 16 * 1024 * 1024)
+
+def extraction_cache_stats():
+    return get_extraction_cache().stats()
+
+def file_digest(file_path):
+    """
+    SHA-256 of the file contents, reusing the stored digest when the
+    file's size and modification time have not changed.
+    """
+    stat = os.stat(file_path)
+    index = get_stat_index()
+    index_key = os.path.abspath(file_path)
+    entry = index.get(index_key)
+    if entry is not None:
+        entry = json.loads(entry)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    index.set(index_key, json.dumps({
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+    }).encode("utf-8"))
+    return digest
+
+def extraction_settings():
+    """
+    Every setting that changes the extracted records: which pages and
+    images get OCR, how they are rendered, and the OCR itself.
+    """
+    return {
+        "extractor": EXTRACTOR_VERSION,
+        "pdf_ocr_mode": file_processing.PDF_OCR_MODE,
+        "pdf_sparse_text_chars": file_processing.PDF_SPARSE_TEXT_CHARS,
+        "pdf_render_dpi": file_processing.PDF_RENDER_DPI,
+        "ocr_lang": ocr_utils.OCR_LANG,
+        "ocr_config": ocr_utils.OCR_CONFIG,
+        "ocr_cache": ocr_utils.OCR_CACHE_VERSION,
+        "image_triage": image_triage.IMAGE_TRIAGE,
+        "triage": [
+            image_triage.TRIAGE_MIN_SIDE,
+            image_triage.TRIAGE_MIN_AREA,
+            image_triage.TRIAGE_MIN_EDGE_DENSITY,
+            image_triage.TRIAGE_MIN_CONTRAST,
+            image_triage.TRIAGE_MAX_SIDE,
+            image_triage.TRIAGE_EDGE_STEP,
+            image_triage.TRIAGE_SAMPLE_SIDE,
+        ],
+    }
+
+def extraction_cache_key(digest, file_path):
+    # Settings that change the extracted text are part of the key
+    ext = os.path.splitext(file_path)[-1].lower()
+    settings = json.dumps(extraction_settings(), sort_keys=True)
+    return f"{digest}:{ext}:{hashlib.sha256(settings.encode('utf-8')).hexdigest()[:16]}"
+
+def encode_records(records):
+    return zlib.compress(json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+def decode_records(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+def iter_extract_cached(file_path):
+    """
+    Same records as iter_extract_from_file, served from the extraction
+    cache when this exact file content was extracted before with the
+    same extractor version and OCR settings. Fresh extractions are stored
+    once the whole file has been read, unless OCR failed on any image.
+    """
+    if not EXTRACTION_CACHE:
+        yield from iter_extract_from_file(file_path)
+        return
+
+    cache = get_extraction_cache()
+    key = extraction_cache_key(file_digest(file_path), file_path)
+    stored = cache.get(key)
+    if stored is not None:
+        log.info(f"⚡ Using cached extraction: {file_path}")
+        with span("extract.cached", path=file_path):
+            records = decode_records(stored)
+        yield from records
+        return
+
+    failures = ocr_failures_in_thread()
+    records = []
+    for record in iter_extract_from_file(file_path):
+        records.append(record)
+        yield record
+    if ocr_failures_in_thread() == failures:
+        cache.set(key, encode_records(records))
+    else:
+        log.warning(f"⚠️ OCR failed on some images, not caching extraction: {file_path}")
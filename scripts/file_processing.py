@@ -1,91 +1,222 @@
 import os
-from io import BytesIO
-from PIL import Image
-import fitz  # PyMuPDF
-import docx
-from pptx import Presentation
 
-from scripts.ocr_utils import ocr_image_from_bytes  # use OCR utils
+from scripts.ocr_utils import ocr_images_from_bytes, ocr_images_in_worker, record_ocr_outcome  # use OCR utils
+from scripts.worker_pool import WORKER_PROCESSES, imap_on_pool
+
+# PyMuPDF, python-docx and python-pptx are imported inside the extractor that
+# needs them, so a run over PDFs never loads the Office libraries (and vice versa)
+
+# Most pages per PDF extraction task sent to the worker pool; short documents
+# are split into smaller tasks so every worker gets a share of the OCR
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Pages with less native text than this are treated as scanned and get OCR
+PDF_SPARSE_TEXT_CHARS = int(os.getenv("PDF_SPARSE_TEXT_CHARS", "200"))
+# "sparse", "render" or "all", see iter_pdf_records
+PDF_OCR_MODE = os.getenv("PDF_OCR_MODE", "sparse")
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "200"))
+# Records are buffered until this many images are waiting, then OCR'd as one batch
+OCR_BATCH_IMAGES = int(os.getenv("OCR_BATCH_IMAGES", "32"))
+
+# Extractors yield one record per page / slide / part:
+#   {"index": ..., "text": str, "ocr_texts": [str], "images": [{"index", "ocr_text"}]}
+# Image payloads are dropped once OCR is done unless keep_image_bytes=True.
+
+def attach_ocr_text(images):
+    """
+    OCR every collected image in one batch on the shared worker pool and
+    store the result on each entry, keeping the original order.
+    """
+    ocr_texts = ocr_images_from_bytes(img["image_bytes"] for img in images)
+    for img, ocr_text in zip(images, ocr_texts):
+        img["ocr_text"] = ocr_text
+    return images
+
+def _finish_records(records, keep_image_bytes):
+    attach_ocr_text([img for record in records for img in record["images"]])
+    for record in records:
+        record["ocr_texts"] = [img["ocr_text"] for img in record["images"] if img["ocr_text"]]
+        if not keep_image_bytes:
+            for img in record["images"]:
+                img.pop("image_bytes", None)
+        yield record
+
+def iter_ocr_records(raw_records, keep_image_bytes=False):
+    """
+    OCR the images of a stream of raw records in batches of about
+    OCR_BATCH_IMAGES and yield the finished records in order, so only one
+    batch of image payloads is held at a time.
+    """
+    buffered = []
+    pending_images = 0
+    for record in raw_records:
+        buffered.append(record)
+        pending_images += len(record["images"])
+        if pending_images >= OCR_BATCH_IMAGES:
+            yield from _finish_records(buffered, keep_image_bytes)
+            buffered = []
+            pending_images = 0
+    yield from _finish_records(buffered, keep_image_bytes)
+
+# ---------- PAGE-PARALLEL PDF EXTRACTION ----------
+def _pdf_page_images(doc, page, page_num, ocr_mode, sparse):
+    if ocr_mode == "render" and sparse and page.get_images():
+        # Scanned page: OCR the rendered page once instead of its image fragments
+        pixmap = page.get_pixmap(dpi=PDF_RENDER_DPI)
+        return [{"index": f"{page_num}_page", "image_bytes": pixmap.tobytes("png")}]
+    if ocr_mode != "all" and not sparse:
+        # The text layer already covers this page
+        return []
 
-def extract_text_images_from_pdf(file_path):
-    doc = fitz.open(file_path)
-    text = ""
     images = []
-
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        text += page.get_text()
-
-        for img_index, img in enumerate(page.get_images(full=True)):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            img_bytes = base_image["image"]
-
-            ocr_text = ocr_image_from_bytes(img_bytes)
-
-            images.append({
-                "index": f"{page_num}_{img_index}",
-                "ocr_text": ocr_text,
-                "image_bytes": img_bytes,
+    for img_index, img in enumerate(page.get_images(full=True)):
+        xref = img[0]
+        base_image = doc.extract_image(xref)
+        images.append({
+            "index": f"{page_num}_{img_index}",
+            "image_bytes": base_image["image"],
+        })
+    return images
+
+def extract_pdf_page_range(args):
+    """
+    Extract and OCR pages [start, stop) of a PDF with its own PyMuPDF
+    handle, so it can run in a worker process. Images are triaged and
+    OCR'd here, and only their text goes back to the parent unless
+    keep_image_bytes is set. Returns the finished records and the OCR
+    outcomes to record in the parent.
+    """
+    import fitz  # PyMuPDF
+    file_path, start, stop, ocr_mode, keep_image_bytes = args
+    doc = fitz.open(file_path)
+    records = []
+    try:
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            page_text = page.get_text()
+            sparse = len(page_text.strip()) < PDF_SPARSE_TEXT_CHARS
+            records.append({
+                "index": page_num,
+                "text": page_text,
+                "images": _pdf_page_images(doc, page, page_num, ocr_mode, sparse),
             })
-
-    return text, images
-
-
-def extract_text_images_from_docx(file_path):
-    doc = docx.Document(file_path)
-    text = "\n".join(p.text for p in doc.paragraphs)
+    finally:
+        doc.close()
+
+    images = [img for record in records for img in record["images"]]
+    ocr_texts, outcomes = ocr_images_in_worker(img["image_bytes"] for img in images)
+    for img, ocr_text in zip(images, ocr_texts):
+        img["ocr_text"] = ocr_text
+        if not keep_image_bytes:
+            del img["image_bytes"]
+    for record in records:
+        record["ocr_texts"] = [img["ocr_text"] for img in record["images"] if img["ocr_text"]]
+    return records, outcomes
+
+def iter_pdf_records(file_path, ocr_mode=None, keep_image_bytes=False):
+    """
+    ocr_mode: "sparse" OCRs embedded images only on pages with little
+    native text, "render" OCRs such pages as a whole rendered image, and
+    "all" OCRs every embedded image.
+    """
+    import fitz  # PyMuPDF
+    ocr_mode = ocr_mode or PDF_OCR_MODE
+    with fitz.open(file_path) as doc:
+        page_count = len(doc)
+
+    pages_per_task = max(1, min(PDF_PAGES_PER_TASK, -(-page_count // max(WORKER_PROCESSES, 1))))
+    tasks = (
+        (file_path, start, min(start + pages_per_task, page_count), ocr_mode, keep_image_bytes)
+        for start in range(0, page_count, pages_per_task)
+    )
+    for records, outcomes in imap_on_pool(extract_pdf_page_range, tasks):
+        for result, decision in outcomes:
+            record_ocr_outcome(result, decision)
+        yield from records
+
+def iter_docx_records(file_path, keep_image_bytes=False):
+    import docx
+
+    def raw_records():
+        doc = docx.Document(file_path)
+        yield {
+            "index": "body",
+            "text": "\n\n".join(p.text for p in doc.paragraphs),
+            "images": [],
+        }
+
+        for rel in doc.part._rels:
+            rel_obj = doc.part._rels[rel]
+            # Check if this rel is an image
+            if "image" in rel_obj.target_ref:
+                yield {
+                    "index": rel,
+                    "text": "",
+                    "images": [{"index": rel, "image_bytes": rel_obj.target_part.blob}],
+                }
+
+    yield from iter_ocr_records(raw_records(), keep_image_bytes)
+
+def iter_pptx_records(file_path, keep_image_bytes=False):
+    from pptx import Presentation
+
+    def raw_records():
+        prs = Presentation(file_path)
+        for slide_num, slide in enumerate(prs.slides):
+            texts = []
+            images = []
+            for shape in slide.shapes:
+                if hasattr(shape, "text") and shape.text:
+                    texts.append(shape.text)
+                # shape_type 13 means picture
+                if shape.shape_type == 13:
+                    images.append({
+                        "index": f"{slide_num}",
+                        "image_bytes": shape.image.blob,
+                    })
+            yield {"index": slide_num, "text": "\n".join(texts), "images": images}
+
+    yield from iter_ocr_records(raw_records(), keep_image_bytes)
+
+# File extension -> record extractor; each one imports its parsing library on first use
+FILE_EXTRACTORS = {
+    ".pdf": iter_pdf_records,
+    ".docx": iter_docx_records,
+    ".pptx": iter_pptx_records,
+}
+
+def iter_extract_from_file(file_path, keep_image_bytes=False):
+    ext = os.path.splitext(file_path)[-1].lower()
+    extractor = FILE_EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ValueError(f"Unsupported file format: {ext}")
+    return extractor(file_path, keep_image_bytes=keep_image_bytes)
+
+def collect_records(records):
+    """
+    Turn a record stream into the (text, images) pair returned by the
+    extract_* functions.
+    """
+    texts = []
     images = []
+    for record in records:
+        if record["text"]:
+            texts.append(record["text"])
+        images.extend(record["images"])
+    # Blank lines mark page / slide / paragraph boundaries for the chunker
+    return "\n\n".join(texts), images
 
-    for rel in doc.part._rels:
-        rel_obj = doc.part._rels[rel]
-        # Check if this rel is an image
-        if "image" in rel_obj.target_ref:
-            image_data = rel_obj.target_part.blob
-
-            ocr_text = ocr_image_from_bytes(image_data)
 
-            images.append({
-                "index": rel,
-                "ocr_text": ocr_text,
-                "image_bytes": image_data,
-            })
+def extract_text_images_from_pdf(file_path, ocr_mode=None, keep_image_bytes=False):
+    return collect_records(iter_pdf_records(file_path, ocr_mode, keep_image_bytes))
 
-    return text, images
 
+def extract_text_images_from_docx(file_path, keep_image_bytes=False):
+    return collect_records(iter_docx_records(file_path, keep_image_bytes))
 
-def extract_text_images_from_pptx(file_path):
-    prs = Presentation(file_path)
-    text = ""
-    images = []
-
-    for slide_num, slide in enumerate(prs.slides):
-        for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text:
-                text += shape.text + "\n"
-            # shape_type 13 means picture
-            if shape.shape_type == 13:
-                img = shape.image
-                image_bytes = img.blob
 
-                ocr_text = ocr_image_from_bytes(image_bytes)
+def extract_text_images_from_pptx(file_path, keep_image_bytes=False):
+    return collect_records(iter_pptx_records(file_path, keep_image_bytes))
 
-                images.append({
-                    "index": f"{slide_num}",
-                    "ocr_text": ocr_text,
-                    "image_bytes": image_bytes,
-                })
 
-    return text, images
-
-
-def extract_from_file(file_path):
-    ext = os.path.splitext(file_path)[-1].lower()
-    if ext == ".pdf":
-        return extract_text_images_from_pdf(file_path)
-    elif ext == ".docx":
-        return extract_text_images_from_docx(file_path)
-    elif ext == ".pptx":
-        return extract_text_images_from_pptx(file_path)
-    else:
-        raise ValueError(f"Unsupported file format: {ext}")
+def extract_from_file(file_path, keep_image_bytes=False):
+    return collect_records(iter_extract_from_file(file_path, keep_image_bytes))
@@ -1,10 +1,30 @@
 import os
-import requests
+import io
+import csv
+import logging
+import tempfile
 from urllib.parse import urlparse, parse_qs
-import time
+from bs4 import BeautifulSoup
 
-def create_downloads_folder():
-    os.makedirs("downloads", exist_ok=True)
+try:
+    import openpyxl
+except ImportError:  # Sheets fall back to the single-sheet CSV export
+    openpyxl = None
+
+from scripts.config import env_flag
+from scripts.downloads import DownloadError, download, download_to_file
+from scripts.file_processing import iter_extract_from_file, iter_pptx_records
+from scripts.telemetry import incr, span
+
+log = logging.getLogger(__name__)
+
+# Slides are exported as .pptx (text and images) unless this is 0, in which case only plain text is fetched
+GOOGLE_SLIDES_IMAGES = env_flag("GOOGLE_SLIDES_IMAGES", True)
+# Exports larger than this are abandoned in favour of the next format
+GOOGLE_EXPORT_MAX_BYTES = int(os.getenv("GOOGLE_EXPORT_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Google services that have export formats
+GOOGLE_DOCUMENT_TYPES = ('docs', 'sheets', 'slides')
 
 def identify_google_service(url: str) -> str:
     if 'docs.google.com/document' in url:
@@ -13,66 +33,199 @@ def identify_google_service(url: str) -> str:
         return 'sheets'
     elif 'docs.google.com/presentation' in url:
         return 'slides'
+    elif 'drive.google.com' in url:
+        return 'drive'
     else:
         return 'unknown'
 
+def is_google_document(url: str) -> bool:
+    return identify_google_service(url) in GOOGLE_DOCUMENT_TYPES
+
 def extract_doc_id(url: str) -> str:
     if '/d/' in url:
         return url.split('/d/')[1].split('/')[0]
     parsed = urlparse(url)
     return parse_qs(parsed.query).get('id', [None])[0]
 
-def build_export_url(doc_type: str, doc_id: str) -> str:
+def build_export_url(doc_type: str, doc_id: str, fmt: str = "pdf") -> str:
     if doc_type == 'docs':
-        return f"https://docs.google.com/document/d/{doc_id}/export?format=pdf"
+        return f"https://docs.google.com/document/d/{doc_id}/export?format={fmt}"
     elif doc_type == 'sheets':
-        return f"https://docs.google.com/spreadsheets/d/{doc_id}/export?format=pdf"
+        return f"https://docs.google.com/spreadsheets/d/{doc_id}/export?format={fmt}"
     elif doc_type == 'slides':
-        return f"https://docs.google.com/presentation/d/{doc_id}/export/pdf"
+        return f"https://docs.google.com/presentation/d/{doc_id}/export/{fmt}"
     return ""
 
-def download_pdf(url: str, session: requests.Session) -> str | None:
-    doc_type = identify_google_service(url)
-    if doc_type == 'unknown':
-        print(f"Unsupported URL: {url}")
+# ---------- NATIVE EXPORTS ----------
+def fetch_export(doc_type, doc_id, fmt, session=None):
+    """
+    Download one export format. Returns the bytes, or None when the export
+    fails or Google answers with an HTML page instead (sign-in or error
+    page for documents that are not shared publicly).
+    """
+    export_url = build_export_url(doc_type, doc_id, fmt)
+    try:
+        with span("google.export", doc_type=doc_type, format=fmt):
+            data, _ = download(
+                export_url,
+                session=session,
+                max_bytes=GOOGLE_EXPORT_MAX_BYTES,
+                reject_html=fmt != "html",
+            )
+    except DownloadError as e:
+        if e.content_type and "text/html" in e.content_type.lower() and e.status == 200:
+            log.warning(f"⚠️ Google {fmt} export returned an HTML page, is the document public?")
+        else:
+            log.warning(f"⚠️ Google {fmt} export failed: {e}")
         return None
+    incr("google_exports_total", doc_type=doc_type, format=fmt)
+    return data
 
-    doc_id = extract_doc_id(url)
-    if not doc_id:
-        print(f"Could not extract doc ID from: {url}")
-        return None
+def html_export_to_text(html_bytes):
+    soup = BeautifulSoup(html_bytes, "html.parser")
+    for tag in soup(["style", "script"]):
+        tag.decompose()
+    return soup.get_text(separator="\n", strip=True)
 
-    export_url = build_export_url(doc_type, doc_id)
-    if not export_url:
-        print(f"Could not build export URL for: {url}")
-        return None
+def workbook_to_text(xlsx_bytes):
+    """
+    Render every sheet of an .xlsx export as tab-separated rows under a
+    "Sheet: <name>" heading, separated by blank lines for the chunker.
+    """
+    workbook = openpyxl.load_workbook(io.BytesIO(xlsx_bytes), read_only=True, data_only=True)
+    sections = []
+    try:
+        for sheet in workbook.worksheets:
+            rows = []
+            for row in sheet.iter_rows(values_only=True):
+                cells = ["" if value is None else str(value) for value in row]
+                if any(cells):
+                    rows.append("\t".join(cells).rstrip())
+            if rows:
+                sections.append(f"Sheet: {sheet.title}\n" + "\n".join(rows))
+    finally:
+        workbook.close()
+    return "\n\n".join(sections)
 
-    filename = f"{doc_type}_{doc_id[:8]}.pdf"
-    filepath = os.path.join("downloads", filename)
+def csv_export_to_text(csv_bytes):
+    reader = csv.reader(io.StringIO(csv_bytes.decode("utf-8-sig", errors="replace")))
+    return "\n".join("\t".join(row).rstrip() for row in reader if any(row))
 
-    try:
-        response = session.get(export_url)
-        if response.status_code == 200:
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-            print(f"✅ Saved: {filepath}")
-            return filepath
-        else:
-            print(f"❌ Failed to download PDF: HTTP {response.status_code}")
-    except Exception as e:
-        print(f"❌ Error downloading: {e}")
+def extract_google_docs(doc_id, session=None):
+    data = fetch_export("docs", doc_id, "txt", session)
+    if data is not None:
+        return data.decode("utf-8-sig", errors="replace"), []
+    data = fetch_export("docs", doc_id, "html", session)
+    if data is not None:
+        return html_export_to_text(data), []
+    return None
+
+def extract_google_sheets(doc_id, session=None):
+    if openpyxl is not None:
+        data = fetch_export("sheets", doc_id, "xlsx", session)
+        if data is not None:
+            try:
+                return workbook_to_text(data), []
+            except Exception as e:
+                log.warning(f"⚠️ Could not read Sheets xlsx export, trying CSV: {e}")
+    # The CSV export only covers the first sheet
+    data = fetch_export("sheets", doc_id, "csv", session)
+    if data is not None:
+        return csv_export_to_text(data), []
+    return None
 
+def extract_google_slides(doc_id, session=None):
+    if GOOGLE_SLIDES_IMAGES:
+        data = fetch_export("slides", doc_id, "pptx", session)
+        if data is not None:
+            try:
+                texts, ocr_texts = [], []
+                for record in iter_pptx_records(io.BytesIO(data)):
+                    if record["text"]:
+                        texts.append(record["text"])
+                    ocr_texts.extend(record["ocr_texts"])
+                return "\n\n".join(texts), ocr_texts
+            except Exception as e:
+                log.warning(f"⚠️ Could not read Slides pptx export, trying text: {e}")
+    data = fetch_export("slides", doc_id, "txt", session)
+    if data is not None:
+        return data.decode("utf-8-sig", errors="replace"), []
     return None
 
+NATIVE_EXTRACTORS = {
+    "docs": extract_google_docs,
+    "sheets": extract_google_sheets,
+    "slides": extract_google_slides,
+}
 
-def google_to_pdf(url):
+def extract_google_via_pdf(doc_type, doc_id, session=None):
+    """
+    Last resort: export as PDF to a temporary file, extract it like any
+    other PDF and delete it.
+    """
+    path = download_pdf(build_export_url(doc_type, doc_id), session, directory=tempfile.gettempdir())
+    if path is None:
+        return None
+    try:
+        texts, ocr_texts = [], []
+        for record in iter_extract_from_file(path):
+            if record["text"]:
+                texts.append(record["text"])
+            ocr_texts.extend(record["ocr_texts"])
+        return "\n\n".join(texts), ocr_texts
+    finally:
+        os.remove(path)
 
-    create_downloads_folder()
-    session = requests.Session()
-    session.headers.update({'User-Agent': 'Mozilla/5.0'})
+def extract_google_content(url, session=None):
+    """
+    Extract (text, ocr_texts) from a Google Docs / Sheets / Slides link
+    using the native export formats, falling back to the PDF export.
+    Returns None when the document cannot be fetched.
+    """
+    doc_type = identify_google_service(url)
+    doc_id = extract_doc_id(url)
+    if doc_type not in GOOGLE_DOCUMENT_TYPES or not doc_id:
+        log.warning(f"⚠️ Not a supported Google document link: {url}")
+        return None
 
-    filepath = download_pdf(url, session)
-    return filepath
-        
+    with span("google.extract", doc_type=doc_type) as attrs:
+        result = NATIVE_EXTRACTORS[doc_type](doc_id, session)
+        attrs["path"] = "native"
+        if result is None or not (result[0].strip() or result[1]):
+            log.info(f"📄 Native Google {doc_type} export unavailable, falling back to PDF")
+            result = extract_google_via_pdf(doc_type, doc_id, session)
+            attrs["path"] = "pdf"
+    return result
 
+# ---------- PDF DOWNLOAD ----------
+def download_pdf(url: str, session=None, directory: str = "downloads") -> str | None:
+    """
+    Save the PDF export of a Google document to a new, uniquely named file
+    in directory and return its path (None on failure). The caller deletes it.
+    """
+    doc_type = identify_google_service(url)
+    if doc_type not in GOOGLE_DOCUMENT_TYPES:
+        log.info(f"Unsupported URL: {url}")
+        return None
+
+    doc_id = extract_doc_id(url)
+    if not doc_id:
+        log.info(f"Could not extract doc ID from: {url}")
+        return None
+
+    try:
+        with span("google.export", doc_type=doc_type, format="pdf"):
+            filepath = download_to_file(
+                build_export_url(doc_type, doc_id),
+                directory=directory,
+                prefix=f"{doc_type}_{doc_id[:8]}_",
+                suffix=".pdf",
+                session=session,
+                max_bytes=GOOGLE_EXPORT_MAX_BYTES,
+                reject_html=True,
+            )
+    except DownloadError as e:
+        log.error(f"❌ Failed to download PDF: {e}")
+        return None
+    log.info(f"✅ Saved: {filepath}")
+    return filepath
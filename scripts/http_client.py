@@ -0,0 +1,65 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default timeout (seconds) for plain HTTP requests
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+# Connections kept open per host by the shared session
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+_session = None
+_download_session = None
+_session_lock = threading.Lock()
+
+def create_http_session(retry_statuses=(502, 503, 504), respect_retry_after=True):
+    session = requests.Session()
+    session.headers.update({
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.5",
+    })
+    retries = Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=list(retry_statuses),
+        allowed_methods=["GET", "HEAD"],
+        respect_retry_after_header=respect_retry_after,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_http_session():
+    """
+    Return the process-wide pooled session so connections are reused
+    across pages, images and downloads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_http_session()
+        return _session
+
+def get_download_session():
+    """
+    Pooled session for scripts.downloads. Its adapter only retries
+    connection errors and 502 / 504 and ignores Retry-After, so 429 and 503
+    reach download(), which caps the wait and gives up its concurrency slot
+    while waiting.
+    """
+    global _download_session
+    with _session_lock:
+        if _download_session is None:
+            _download_session = create_http_session(retry_statuses=(502, 504), respect_retry_after=False)
+        return _download_session
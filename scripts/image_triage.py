@@ -0,0 +1,88 @@
+import os
+import threading
+from io import BytesIO
+import numpy as np
+from PIL import Image
+
+from scripts.config import env_flag
+
+# Set IMAGE_TRIAGE=0 to OCR every image unconditionally
+IMAGE_TRIAGE = env_flag("IMAGE_TRIAGE", True)
+# Images smaller than this on either side (icons, bullets, tracking pixels) are skipped
+TRIAGE_MIN_SIDE = int(os.getenv("TRIAGE_MIN_SIDE", "24"))
+TRIAGE_MIN_AREA = int(os.getenv("TRIAGE_MIN_AREA", str(48 * 48)))
+# Share of sampled pixels that must sit on an edge, and the minimum grey-level spread
+TRIAGE_MIN_EDGE_DENSITY = float(os.getenv("TRIAGE_MIN_EDGE_DENSITY", "0.01"))
+TRIAGE_MIN_CONTRAST = float(os.getenv("TRIAGE_MIN_CONTRAST", "6"))
+# Images larger than this on their longest side are downscaled before OCR
+TRIAGE_MAX_SIDE = int(os.getenv("TRIAGE_MAX_SIDE", "3000"))
+# Grey-level step between neighbouring pixels that counts as an edge
+TRIAGE_EDGE_STEP = 32
+# Side of the thumbnail the edge and contrast signals are computed on
+TRIAGE_SAMPLE_SIDE = 512
+
+SKIP_INVALID = "skip_invalid"
+SKIP_SMALL = "skip_small"
+SKIP_FLAT = "skip_flat"
+OCR = "ocr"
+DOWNSCALED = "downscaled"
+# Decisions for which the image is not OCR'd at all
+SKIP_DECISIONS = frozenset({SKIP_INVALID, SKIP_SMALL, SKIP_FLAT})
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def record_triage(decision, count=1):
+    with _stats_lock:
+        _stats[decision] = _stats.get(decision, 0) + count
+
+def triage_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def edge_density_and_contrast(gray):
+    pixels = np.asarray(gray, dtype=np.int16)
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return 0.0, 0.0
+    step_x = np.abs(np.diff(pixels, axis=1))[:-1, :]
+    step_y = np.abs(np.diff(pixels, axis=0))[:, :-1]
+    edges = np.maximum(step_x, step_y) > TRIAGE_EDGE_STEP
+    return float(edges.mean()), float(pixels.std())
+
+def triage_image(image_bytes):
+    """
+    Decide whether an image is worth OCR using cheap signals.
+    Returns (decision, image_bytes_for_ocr). image_bytes_for_ocr is
+    None for skipped images and a downscaled PNG for very large ones.
+    """
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        width, height = img.size
+    except Exception:
+        return SKIP_INVALID, None
+
+    if min(width, height) < TRIAGE_MIN_SIDE or width * height < TRIAGE_MIN_AREA:
+        return SKIP_SMALL, None
+
+    try:
+        # JPEG decoders can produce a reduced-size greyscale image directly
+        img.draft("L", (TRIAGE_SAMPLE_SIDE, TRIAGE_SAMPLE_SIDE))
+        gray = img.convert("L")
+        gray.thumbnail((TRIAGE_SAMPLE_SIDE, TRIAGE_SAMPLE_SIDE))
+    except Exception:
+        return SKIP_INVALID, None
+
+    edge_density, contrast = edge_density_and_contrast(gray)
+    if edge_density < TRIAGE_MIN_EDGE_DENSITY or contrast < TRIAGE_MIN_CONTRAST:
+        return SKIP_FLAT, None
+
+    if max(width, height) <= TRIAGE_MAX_SIDE:
+        return OCR, image_bytes
+
+    full = Image.open(BytesIO(image_bytes))
+    if full.mode not in ("1", "L", "P", "RGB", "RGBA"):
+        full = full.convert("RGB")
+    full.thumbnail((TRIAGE_MAX_SIDE, TRIAGE_MAX_SIDE))
+    buffer = BytesIO()
+    full.save(buffer, format="PNG")
+    return DOWNSCALED, buffer.getvalue()
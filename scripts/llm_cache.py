@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import threading
+
+from scripts.config import env_flag
+from scripts.disk_cache import DiskCache
+from scripts.telemetry import incr, record_usage, span
+
+# Cached responses older than this are re-requested
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+# Set LLM_CACHE_DISABLED=1 (or pass --no-cache to main.py) to always call the API
+LLM_CACHE_DISABLED = env_flag("LLM_CACHE_DISABLED", False)
+
+_cache = None
+_cache_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Return the shared OpenAI client, created on first use so importing the
+    pipeline does not pay for the openai package until a request is made.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _client
+
+def get_llm_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(
+                "llm",
+                max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+                ttl=LLM_CACHE_TTL_HOURS * 3600,
+            )
+    return _cache
+
+def set_llm_cache_enabled(enabled):
+    global LLM_CACHE_DISABLED
+    LLM_CACHE_DISABLED = not enabled
+
+def llm_cache_enabled():
+    return not LLM_CACHE_DISABLED
+
+def llm_cache_key(model, messages, temperature=None, max_tokens=None):
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def llm_cache_stats():
+    return get_llm_cache().stats()
+
+def lookup_chat_completion(model, messages, temperature=None, max_tokens=None, **_):
+    """
+    Return the cached text for a chat completion request, or None when it
+    has not been answered before (or the cache is disabled).
+    """
+    if LLM_CACHE_DISABLED:
+        return None
+    cached = get_llm_cache().get(llm_cache_key(model, messages, temperature, max_tokens))
+    return cached.decode("utf-8") if cached is not None else None
+
+def cached_chat_completion(client, model, messages, temperature=None, max_tokens=None, bypass=None):
+    """
+    Return the stripped text of a chat completion, served from the local
+    response cache when the same (model, messages, temperature, max_tokens)
+    request has been answered before.
+    """
+    if bypass is None:
+        bypass = LLM_CACHE_DISABLED
+
+    key = llm_cache_key(model, messages, temperature, max_tokens)
+    if not bypass:
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            return cached.decode("utf-8")
+
+    params = {"model": model, "messages": messages}
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+
+    with span("llm.chat", model=model) as attrs:
+        response = client.chat.completions.create(**params)
+        usage = getattr(response, "usage", None)
+        attrs["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        attrs["completion_tokens"] = getattr(usage, "completion_tokens", None)
+    incr("llm_requests_total", model=model, mode="online")
+    record_usage(model, usage)
+    content = response.choices[0].message.content.strip()
+    get_llm_cache().set(key, content.encode("utf-8"))
+    return content
+
+def store_chat_completion(model, messages, content, temperature=None, max_tokens=None):
+    """
+    Record a completion obtained outside cached_chat_completion (e.g. from a
+    batch job) so later interactive runs are served from the cache.
+    """
+    key = llm_cache_key(model, messages, temperature, max_tokens)
+    get_llm_cache().set(key, content.encode("utf-8"))
@@ -0,0 +1,234 @@
+"""
+Local stand-in for the parts of the OpenAI API this project uses:
+chat completions, file upload/download and the batch interface.
+
+Start it with `python -m scripts.mock_openai --port 8799` and point the
+pipeline at it with OPENAI_BASE_URL=http://127.0.0.1:8799/v1 (any
+OPENAI_API_KEY value is accepted). No network access is needed.
+"""
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def mock_completion_text(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    preview = " ".join(prompt.split())[:80]
+    return f"Mock feedback for a {len(prompt.split())}-word prompt: {preview}"
+
+def mock_chat_completion(body):
+    messages = body.get("messages", [])
+    content = mock_completion_text(messages)
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+class MockOpenAIState:
+    def __init__(self, latency=0.0, jitter=0.0, batch_delay=0.5):
+        self.latency = latency
+        self.jitter = jitter
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    def sleep_latency(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def add_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = (record, content)
+        return record
+
+    def run_batch(self, batch_id):
+        time.sleep(self.batch_delay)
+        with self.lock:
+            batch = self.batches[batch_id]
+            _, content = self.files[batch["input_file_id"]]
+
+        lines = []
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": mock_chat_completion(request["body"]),
+                },
+                "error": None,
+            }))
+        output = self.add_file(("\n".join(lines) + "\n").encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+
+        with self.lock:
+            batch.update({
+                "status": "completed",
+                "output_file_id": output["id"],
+                "completed_at": int(time.time()),
+                "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+            })
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _not_found(self):
+        self._send_json({"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}}, 404)
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        with self.state.lock:
+            self.state.request_count += 1
+
+        if path.endswith("/chat/completions"):
+            body = json.loads(self._read_body() or b"{}")
+            self.state.sleep_latency()
+            self._send_json(mock_chat_completion(body))
+        elif path.endswith("/files"):
+            self._handle_upload()
+        elif path.endswith("/batches"):
+            body = json.loads(self._read_body() or b"{}")
+            batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+            batch = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "in_progress",
+                "created_at": int(time.time()),
+                "metadata": body.get("metadata"),
+            }
+            with self.state.lock:
+                self.state.batches[batch_id] = batch
+            threading.Thread(target=self.state.run_batch, args=(batch_id,), daemon=True).start()
+            self._send_json(batch)
+        else:
+            self._not_found()
+
+    def _handle_upload(self):
+        body = self._read_body()
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=default_policy).parsebytes(header + body)
+        content, filename, purpose = b"", "upload.jsonl", "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            elif name == "purpose":
+                purpose = part.get_content().strip()
+        self._send_json(self.state.add_file(content, filename, purpose))
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+        with self.state.lock:
+            self.state.request_count += 1
+
+        if len(parts) >= 2 and parts[-2] == "batches":
+            with self.state.lock:
+                batch = self.state.batches.get(parts[-1])
+            return self._send_json(batch) if batch else self._not_found()
+        if len(parts) >= 3 and parts[-1] == "content" and parts[-3] == "files":
+            with self.state.lock:
+                entry = self.state.files.get(parts[-2])
+            if not entry:
+                return self._not_found()
+            content = entry[1]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        if len(parts) >= 2 and parts[-2] == "files":
+            with self.state.lock:
+                entry = self.state.files.get(parts[-1])
+            return self._send_json(entry[0]) if entry else self._not_found()
+        self._not_found()
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.0, jitter=0.0, batch_delay=0.5):
+    """
+    Start the mock API in a background thread. Returns (server, base_url);
+    call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.state = MockOpenAIState(latency=latency, jitter=jitter, batch_delay=batch_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each chat completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds around the latency")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_mock_server(args.host, args.port, args.latency, args.jitter)
+    print(f"🧪 Mock OpenAI API listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
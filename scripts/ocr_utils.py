@@ -1,18 +1,85 @@
+import os
+import logging
+import hashlib
+import threading
 from PIL import Image
 import pytesseract
 from io import BytesIO
 
-def ocr_image_from_bytes(image_bytes):
+from scripts.disk_cache import DiskCache
+from scripts.worker_pool import map_on_pool
+from scripts.telemetry import incr, span
+from scripts.image_triage import IMAGE_TRIAGE, OCR, SKIP_DECISIONS, record_triage, triage_image
+
+log = logging.getLogger(__name__)
+
+# Tesseract language and extra config, both part of the cache key
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_CONFIG = os.getenv("OCR_CONFIG", "")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+# Bumped when entries written by an older version may be wrong; older entries are then ignored
+OCR_CACHE_VERSION = "2"
+
+_cache = None
+_cache_pid = None
+_lock = threading.Lock()
+# Failed OCR calls made from each thread, so callers can avoid caching incomplete results
+_thread_failures = threading.local()
+
+# ---------- CONTENT-ADDRESSED OCR CACHE ----------
+def get_ocr_cache():
+    global _cache, _cache_pid
+    with _lock:
+        # A forked pool worker opens its own connection instead of sharing the parent's
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = DiskCache("ocr", max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024)
+            _cache_pid = os.getpid()
+    return _cache
+
+def ocr_cache_key(image_bytes, lang=OCR_LANG, config=OCR_CONFIG):
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{digest}:{lang}:{config}:{OCR_CACHE_VERSION}"
+
+def ocr_cache_stats():
+    return get_ocr_cache().stats()
+
+def ocr_failures_in_thread():
+    return getattr(_thread_failures, "count", 0)
+
+def _run_ocr(image_bytes, lang=OCR_LANG, config=OCR_CONFIG):
     """
-    Run OCR on image bytes and return extracted text.
+    Run Tesseract without touching the cache. Returns None on failure so
+    that failed images are not cached.
     """
     try:
         img = Image.open(BytesIO(image_bytes))
-        text = pytesseract.image_to_string(img).strip()
-        return text
+        return pytesseract.image_to_string(img, lang=lang, config=config).strip()
     except Exception as e:
-        print(f"❌ OCR failed: {e}")
-        return ""
+        log.error(f"❌ OCR failed: {e}")
+        return None
+
+def triage_and_ocr(image_bytes, lang=OCR_LANG, config=OCR_CONFIG, triage=None):
+    """
+    Triage an image and OCR it when it is worth it, in one step so a worker
+    receives the image once and sends back only text.
+    Returns (triage decision, text); text is None when OCR failed.
+    """
+    triage = IMAGE_TRIAGE if triage is None else triage
+    decision = OCR
+    if triage:
+        decision, image_bytes = triage_image(image_bytes)
+        if decision in SKIP_DECISIONS:
+            return decision, ""
+    return decision, _run_ocr(image_bytes, lang, config)
+
+def _triage_and_ocr_args(args):
+    return triage_and_ocr(*args)
+
+def ocr_image_from_bytes(image_bytes, lang=OCR_LANG, config=OCR_CONFIG):
+    """
+    Run OCR on image bytes and return extracted text.
+    """
+    return ocr_images_from_bytes([image_bytes], max_workers=1, lang=lang, config=config)[0]
 
 def ocr_image_from_pil(img):
     """
@@ -22,5 +89,88 @@ def ocr_image_from_pil(img):
         text = pytesseract.image_to_string(img).strip()
         return text
     except Exception as e:
-        print(f"❌ OCR failed: {e}")
+        log.error(f"❌ OCR failed: {e}")
         return ""
+
+def record_ocr_outcome(result, decision=None):
+    """
+    Count one image's OCR result ("cached", "skipped", "failed" or "ocr")
+    and triage decision in this process. Pool workers that OCR on their own
+    return their outcomes so the parent can record them here.
+    """
+    if decision is not None:
+        record_triage(decision)
+    incr("ocr_images_total", result=result)
+    if result == "failed":
+        _thread_failures.count = ocr_failures_in_thread() + 1
+
+def _ocr_through_cache(images_bytes, lang, config, run_jobs):
+    """
+    OCR images through the cache; run_jobs maps _triage_and_ocr_args over
+    a list of jobs. Returns the text of every image and the
+    (result, decision) outcome of every distinct one.
+    """
+    cache = get_ocr_cache()
+    keys = [ocr_cache_key(b, lang, config) for b in images_bytes]
+    results = {}
+    pending = {}
+    outcomes = []
+    for key, image_bytes in zip(keys, images_bytes):
+        if key in results or key in pending:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            outcomes.append(("cached", None))
+            results[key] = cached.decode("utf-8")
+        else:
+            pending[key] = image_bytes
+
+    if pending:
+        with span("ocr.tesseract", images=len(pending)):
+            triaged = run_jobs([(b, lang, config, IMAGE_TRIAGE) for b in pending.values()])
+        for key, (decision, text) in zip(pending, triaged):
+            decision = decision if IMAGE_TRIAGE else None
+            if decision in SKIP_DECISIONS:
+                outcomes.append(("skipped", decision))
+                results[key] = ""
+            elif text is None:
+                outcomes.append(("failed", decision))
+                results[key] = ""
+            else:
+                outcomes.append(("ocr", decision))
+                cache.set(key, text.encode("utf-8"))
+                results[key] = text
+
+    return [results[key] for key in keys], outcomes
+
+def ocr_images_from_bytes(images_bytes, max_workers=None, lang=OCR_LANG, config=OCR_CONFIG):
+    """
+    Run OCR on a list of image bytes using the shared worker pool.
+    Results are returned in the same order as the input. Images already in
+    the OCR cache, or repeated byte for byte within the batch, are not OCR'd
+    again, and images triaged as icons or flat graphics are skipped. Only
+    identical bytes share a result: slides on one template can look alike
+    and still carry different text.
+    Falls back to serial OCR when the pool is disabled or cannot be used.
+    """
+    images_bytes = list(images_bytes)
+    if not images_bytes:
+        return []
+    texts, outcomes = _ocr_through_cache(
+        images_bytes, lang, config,
+        lambda jobs: map_on_pool(_triage_and_ocr_args, jobs, max_workers),
+    )
+    for result, decision in outcomes:
+        record_ocr_outcome(result, decision)
+    return texts
+
+def ocr_images_in_worker(images_bytes, lang=OCR_LANG, config=OCR_CONFIG):
+    """
+    OCR images serially in this process, for code already running in a
+    pool worker, so the images never travel back to the parent. Returns
+    the texts and the outcomes to pass to record_ocr_outcome in the parent.
+    """
+    images_bytes = list(images_bytes)
+    if not images_bytes:
+        return [], []
+    return _ocr_through_cache(images_bytes, lang, config, lambda jobs: [_triage_and_ocr_args(job) for job in jobs])
@@ -0,0 +1,380 @@
+"""
+Long-running analysis service.
+
+Keeps the OpenAI client, HTTP connection pool, OCR worker processes and
+(optionally) a headless browser warm, and runs submitted jobs from a
+persistent SQLite queue:
+
+    POST /jobs/session    {"inputs": [...], "title": "...", "description": "...", "batch": false, "budget": null}
+    POST /jobs/feedback   {"student": [...], "trainer": [...], "batch": false}
+    GET  /jobs            ?status=queued&limit=50
+    GET  /jobs/<id>       job status
+    GET  /jobs/<id>/result   result and the job's own LLM / cache / OCR usage
+    GET  /health
+    GET  /metrics         Prometheus text
+
+Start it with `python main.py --serve [--port 8800]`.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import traceback
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.config import env_flag
+from scripts.disk_cache import CACHE_DIR
+from scripts.telemetry import incr, prometheus_text, span, summary, usage_scope
+
+log = logging.getLogger(__name__)
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8800"))
+# Jobs run at the same time; each job already fans out over the shared pools
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+SERVICE_DB = os.getenv("SERVICE_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Launch one headless browser at startup so the first JavaScript page does not pay for it
+SERVICE_WARM_BROWSER = env_flag("SERVICE_WARM_BROWSER", False)
+# Jobs interrupted more often than this (e.g. the service crashed while running them) are failed
+SERVICE_MAX_ATTEMPTS = int(os.getenv("SERVICE_MAX_ATTEMPTS", "3"))
+SERVICE_MAX_BODY_BYTES = 10 * 1024 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# ---------- PERSISTENT JOB QUEUE ----------
+class JobQueue:
+    """
+    SQLite-backed FIFO of jobs. Jobs survive restarts: anything still
+    marked running when the service starts is queued again.
+    """
+
+    def __init__(self, path=None):
+        path = path or SERVICE_DB
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " result TEXT,"
+            " usage TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created)")
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "usage" not in columns:
+            # Queues created before usage was recorded per job
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN usage TEXT")
+        self._conn.commit()
+
+    def requeue_interrupted(self):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = 'interrupted too many times', finished = ?"
+                " WHERE status = ? AND attempts >= ?",
+                (FAILED, time.time(), RUNNING, SERVICE_MAX_ATTEMPTS),
+            )
+            count = self._conn.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?", (QUEUED, RUNNING)
+            ).rowcount
+            self._conn.commit()
+            self._ready.notify_all()
+        return count
+
+    def submit(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, time.time()),
+            )
+            self._conn.commit()
+            self._ready.notify()
+        incr("service_jobs_total", kind=kind, event="submitted")
+        return job_id
+
+    def claim(self, timeout=None):
+        """
+        Mark the oldest queued job as running and return it, waiting up to
+        timeout seconds for one to arrive. Returns None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE id = ?",
+                        (RUNNING, time.time(), row["id"]),
+                    )
+                    self._conn.commit()
+                    return dict(row)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._ready.wait(remaining)
+
+    def finish(self, job_id, result, usage=None):
+        self._set_final(job_id, DONE, result=result, usage=usage)
+
+    def fail(self, job_id, error, usage=None):
+        self._set_final(job_id, FAILED, error=error, usage=usage)
+
+    def _set_final(self, job_id, status, result=None, error=None, usage=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, usage = ?, finished = ? WHERE id = ?",
+                (status, result, error, json.dumps(usage) if usage is not None else None, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        query = "SELECT id, kind, status, attempts, created, started, finished FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params)]
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+def job_summary(job):
+    """
+    Job record as returned by the API: without payload and result.
+    """
+    return {key: job[key] for key in ("id", "kind", "status", "attempts", "error", "created", "started", "finished") if key in job}
+
+# ---------- JOB RUNNERS ----------
+def run_session_job(payload):
+    from main import DEFAULT_SESSION_DESCRIPTION, DEFAULT_SESSION_TITLE, analyze_session
+    inputs = payload.get("inputs") or []
+    if not inputs:
+        raise ValueError("inputs must be a non-empty list of files or URLs")
+    return analyze_session(
+        inputs,
+        payload.get("title") or DEFAULT_SESSION_TITLE,
+        payload.get("description") or DEFAULT_SESSION_DESCRIPTION,
+        batch=bool(payload.get("batch")),
+        token_budget=payload.get("budget"),
+        report=False,
+    )
+
+def run_feedback_job(payload):
+    from feedback_summary import analyze_large_feedback
+    return analyze_large_feedback(
+        payload.get("student") or [],
+        payload.get("trainer") or [],
+        batch=bool(payload.get("batch")),
+    )
+
+JOB_RUNNERS = {
+    "session": run_session_job,
+    "feedback": run_feedback_job,
+}
+
+def warm_up():
+    """
+    Import the pipeline and create the long-lived clients and pools once,
+    before the first job arrives.
+    """
+    with span("service.warm_up"):
+        # main and the extractors import their heavy dependencies lazily,
+        # so load them here rather than inside the first job
+        import main  # noqa: F401
+        import feedback_summary  # noqa: F401
+        import scripts.analysis  # noqa: F401
+        import scripts.extraction_cache  # noqa: F401
+        import scripts.google_url_processing  # noqa: F401
+        import scripts.url_processing  # noqa: F401
+        from scripts.http_client import get_http_session
+        from scripts.llm_cache import get_client
+        from scripts.worker_pool import get_process_pool
+        import fitz, docx, pptx  # noqa: F401,E401  (document extractors)
+        get_client()
+        get_http_session()
+        get_process_pool()
+        if SERVICE_WARM_BROWSER:
+            from scripts.browser_pool import get_driver_pool
+            with get_driver_pool().driver():
+                pass
+    log.info("🔥 Service warmed up")
+
+class JobWorkers:
+    def __init__(self, queue, workers=None):
+        self.queue = queue
+        self.workers = workers or SERVICE_WORKERS
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.queue.claim(timeout=1.0)
+            if job is None:
+                continue
+            self.run_job(job)
+
+    def run_job(self, job):
+        runner = JOB_RUNNERS.get(job["kind"])
+        log.info(f"▶️ Job {job['id']} ({job['kind']}) started")
+        # Usage counted in this job's scope only, not that of jobs running next to it
+        with usage_scope() as scope:
+            try:
+                if runner is None:
+                    raise ValueError(f"Unknown job kind: {job['kind']}")
+                with span("service.job", job=job["id"], kind=job["kind"]):
+                    result = runner(json.loads(job["payload"]))
+            except Exception as e:
+                log.error(f"❌ Job {job['id']} failed: {e}")
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}", usage=summary(scope))
+                incr("service_jobs_total", kind=job["kind"], event="failed")
+                return
+        self.queue.finish(job["id"], result, usage=summary(scope))
+        incr("service_jobs_total", kind=job["kind"], event="done")
+        log.info(f"✅ Job {job['id']} done")
+
+# ---------- HTTP API ----------
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "KVAnalysis/1.0"
+
+    @property
+    def queue(self):
+        return self.server.queue
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        self._send_json({"error": message}, status)
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        kind = path[len("/jobs/"):] if path.startswith("/jobs/") else None
+        if kind not in JOB_RUNNERS:
+            return self._error(404, f"Unknown path {self.path}")
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > SERVICE_MAX_BODY_BYTES:
+            return self._error(413, "Request body too large")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._error(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            return self._error(400, "Body must be a JSON object")
+
+        job_id = self.queue.submit(kind, payload)
+        self._send_json({"id": job_id, "status": QUEUED}, 202)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            return self._send_json({"status": "ok", "jobs": self.queue.counts()})
+        if parts == ["metrics"]:
+            data = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if parts == ["jobs"]:
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            limit = min(int(query.get("limit", ["50"])[0]), 500)
+            return self._send_json({"jobs": self.queue.list(status, limit)})
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.queue.get(parts[1])
+            if job is None:
+                return self._error(404, "No such job")
+            if len(parts) == 2:
+                return self._send_json(job_summary(job))
+            if parts[2] == "result":
+                usage = json.loads(job["usage"]) if job.get("usage") else None
+                if job["status"] == DONE:
+                    return self._send_json({"id": job["id"], "status": DONE, "result": job["result"], "usage": usage})
+                if job["status"] == FAILED:
+                    return self._send_json({"id": job["id"], "status": FAILED, "error": job["error"], "usage": usage}, 500)
+                return self._send_json(job_summary(job), 409)
+        self._error(404, f"Unknown path {self.path}")
+
+def start_service(host=None, port=None, workers=None, db_path=None, warm=True):
+    """
+    Start the API and job workers in background threads. Returns
+    (server, base_url); call server.shutdown() and server.workers.stop()
+    to stop them.
+    """
+    queue = JobQueue(db_path)
+    requeued = queue.requeue_interrupted()
+    if requeued:
+        log.info(f"🔁 Re-queued {requeued} interrupted jobs")
+    if warm:
+        warm_up()
+
+    server = ThreadingHTTPServer((host or SERVICE_HOST, SERVICE_PORT if port is None else port), ServiceHandler)
+    server.daemon_threads = True
+    server.queue = queue
+    server.workers = JobWorkers(queue, workers)
+    server.workers.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
+
+def serve(host=None, port=None, workers=None):
+    server, base_url = start_service(host, port, workers)
+    log.info(f"🛰️ Analysis service listening on {base_url} with {server.workers.workers} workers")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        log.info("🛑 Shutting down")
+        server.workers.stop()
+        server.shutdown()
@@ -0,0 +1,90 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.tokens import count_tokens, split_tokens
+from scripts.telemetry import in_current_scope, span
+
+log = logging.getLogger(__name__)
+
+# Token budget for the items packed into a single summarisation call
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "12000"))
+# Summarisation calls in flight at once within one level of the tree
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+
+def pack_by_tokens(items, budget_tokens):
+    """
+    Group items in order so each group's total token count stays within
+    budget_tokens. Items larger than the budget are split into pieces.
+    """
+    groups = []
+    current, current_tokens = [], 0
+    for item in items:
+        tokens = count_tokens(item)
+        pieces = [(item, tokens)]
+        if tokens > budget_tokens:
+            pieces = [(piece, count_tokens(piece)) for piece in split_tokens(item, budget_tokens)]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > budget_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def summarize_level(items, summarize_group, level, budget_tokens=None, max_concurrency=None):
+    """
+    Run one level of the tree: pack items by token budget and summarise the
+    groups concurrently. summarize_group(group, level) returns one string.
+    """
+    budget_tokens = budget_tokens or SUMMARY_INPUT_TOKENS
+    max_concurrency = max_concurrency or SUMMARY_MAX_CONCURRENCY
+    groups = pack_by_tokens(items, budget_tokens)
+    if len(groups) == len(items) > 1:
+        # Every item fills a group on its own; merge pairwise so the tree still shrinks
+        groups = [items[i:i + 2] for i in range(0, len(items), 2)]
+
+    log.info(f"🌲 Summarizing level {level}: {len(items)} items in {len(groups)} calls")
+    with span("summarize.level", level=level, items=len(items), calls=len(groups)):
+        if max_concurrency <= 1 or len(groups) == 1:
+            return [summarize_group(group, level) for group in groups]
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(groups))) as executor:
+            return list(executor.map(in_current_scope(lambda group: summarize_group(group, level)), groups))
+
+def reduce_until_fits(items, summarize_group, budget_tokens=None, max_concurrency=None, level=0):
+    """
+    Summarise items level by level until their combined size fits within
+    budget_tokens. Returns the remaining items (unchanged if they already fit).
+    """
+    budget_tokens = budget_tokens or SUMMARY_INPUT_TOKENS
+    items = list(items)
+    while len(items) > 1 and sum(count_tokens(item) for item in items) > budget_tokens:
+        items = summarize_level(items, summarize_group, level, budget_tokens, max_concurrency)
+        level += 1
+    return items
+
+def reduce_to_one(summaries, summarize_group, budget_tokens=None, max_concurrency=None, level=1):
+    """
+    Keep summarising summaries, level by level, until a single one remains.
+    """
+    summaries = list(summaries)
+    if not summaries:
+        return ""
+    while len(summaries) > 1:
+        summaries = summarize_level(summaries, summarize_group, level, budget_tokens, max_concurrency)
+        level += 1
+    return summaries[0]
+
+def tree_summarize(items, summarize_group, budget_tokens=None, max_concurrency=None):
+    """
+    Map-reduce summarisation: summarise the original items (level 0), then
+    keep summarising the summaries until a single one remains. The number
+    of levels grows logarithmically with the number of items.
+    """
+    items = list(items)
+    if not items:
+        return ""
+    summaries = summarize_level(items, summarize_group, 0, budget_tokens, max_concurrency)
+    return reduce_to_one(summaries, summarize_group, budget_tokens, max_concurrency, level=1)
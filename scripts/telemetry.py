@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import logging
+import itertools
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Write a JSON trace of every span and counter here when the run ends
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Serve Prometheus text metrics on this port (0 = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Only the most recent spans are kept individually; older ones are still in the per-stage totals
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000"))
+METRIC_PREFIX = "kv_"
+
+# USD per million (prompt, completion) tokens; model names are matched by prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+# The batch interface is billed at half price
+BATCH_PRICE_FACTOR = 0.5
+
+_lock = threading.Lock()
+_local = threading.local()
+_span_ids = itertools.count(1)
+_spans = deque(maxlen=TRACE_MAX_SPANS)
+_dropped_spans = 0
+# (name, sorted label items) -> value
+_counters = {}
+# span name -> [count, total seconds, errors]
+_stage_totals = {}
+_started = time.time()
+# Scope of the job running in this context, see usage_scope
+_scope = contextvars.ContextVar("telemetry_scope", default=None)
+
+log = logging.getLogger(__name__)
+
+def configure_logging(level=None):
+    """
+    Send progress messages to stderr as plain lines. LOG_LEVEL=WARNING
+    keeps only problems; LOG_LEVEL=DEBUG adds per-item detail.
+    """
+    logging.basicConfig(level=(level or LOG_LEVEL).upper(), format="%(message)s")
+    # The HTTP clients log every request at INFO
+    for name in ("httpx", "openai", "urllib3"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+# ---------- SCOPES ----------
+class Scope:
+    """
+    Counters and per-stage totals of one job, next to the process-wide
+    ones, so concurrent jobs each see only their own usage.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.counters = {}
+        self.stage_totals = {}
+        self.started = time.time()
+
+    def chain(self):
+        scope = self
+        while scope is not None:
+            yield scope
+            scope = scope.parent
+
+@contextlib.contextmanager
+def usage_scope():
+    """
+    Collect the counters and span totals recorded inside the block, on
+    this thread and on threads started through in_current_scope.
+    Yields the Scope; pass it to summary() for the block's own numbers.
+    """
+    scope = Scope(_scope.get())
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+def in_current_scope(func):
+    """
+    Wrap func so it records into the caller's scope when run on a pool thread.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Each call gets its own copy: one context cannot be entered by two threads at once
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+# ---------- COUNTERS ----------
+def incr(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    scope = _scope.get()
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        for scoped in (scope.chain() if scope else ()):
+            scoped.counters[key] = scoped.counters.get(key, 0) + value
+
+def counter_value(name, scope=None, **labels):
+    """
+    Sum of a counter over every label set that includes the given labels,
+    process-wide or within scope.
+    """
+    wanted = set(labels.items())
+    with _lock:
+        counters = _counters if scope is None else scope.counters
+        return sum(v for (n, items), v in counters.items() if n == name and wanted <= set(items))
+
+# ---------- SPANS ----------
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Time a block of work. Spans opened inside it on the same thread become
+    its children. Yields the attribute dict so callers can add results.
+    """
+    global _dropped_spans
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {
+        "id": next(_span_ids),
+        "parent": stack[-1]["id"] if stack else None,
+        "name": name,
+        "thread": threading.current_thread().name,
+        "start": time.time(),
+        "attrs": attrs,
+    }
+    stack.append(record)
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stack.pop()
+        record["duration"] = time.perf_counter() - started
+        scope = _scope.get()
+        with _lock:
+            for stage_totals in [_stage_totals, *(s.stage_totals for s in (scope.chain() if scope else ()))]:
+                totals = stage_totals.setdefault(name, [0, 0.0, 0])
+                totals[0] += 1
+                totals[1] += record["duration"]
+                totals[2] += 1 if "error" in record else 0
+            if len(_spans) == _spans.maxlen:
+                # The oldest span makes room, so a long-running service keeps tracing
+                _dropped_spans += 1
+            _spans.append(record)
+
+# ---------- TOKEN ACCOUNTING ----------
+def model_price(model):
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return None
+
+def estimate_cost(model, prompt_tokens, completion_tokens, batch=False):
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+    return cost * BATCH_PRICE_FACTOR if batch else cost
+
+def record_usage(model, usage, batch=False):
+    """
+    Count tokens and estimated cost from the usage block of a chat
+    completion (an SDK object or the raw dict from a batch output file).
+    """
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    mode = "batch" if batch else "online"
+    incr("llm_prompt_tokens_total", prompt_tokens, model=model, mode=mode)
+    incr("llm_completion_tokens_total", completion_tokens, model=model, mode=mode)
+    incr("llm_cost_usd_total", estimate_cost(model, prompt_tokens, completion_tokens, batch), model=model, mode=mode)
+
+# ---------- EXPORT ----------
+def summary(scope=None):
+    """
+    Per-stage totals, token usage, cost and cache hit rates for the run,
+    or for one job when given its Scope.
+    """
+    with _lock:
+        stage_totals = _stage_totals if scope is None else scope.stage_totals
+        counters = _counters if scope is None else scope.counters
+        stages = {
+            name: {"count": count, "seconds": round(seconds, 3), "errors": errors}
+            for name, (count, seconds, errors) in sorted(stage_totals.items())
+        }
+        cache_names = sorted({dict(items).get("cache") for n, items in counters if n == "cache_lookups_total"})
+
+    caches = {}
+    for name in cache_names:
+        hits = counter_value("cache_lookups_total", scope, cache=name, result="hit")
+        misses = counter_value("cache_lookups_total", scope, cache=name, result="miss")
+        caches[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0}
+
+    return {
+        "elapsed_seconds": round(time.time() - (_started if scope is None else scope.started), 3),
+        "stages": stages,
+        "llm": {
+            "calls": counter_value("llm_requests_total", scope),
+            "prompt_tokens": counter_value("llm_prompt_tokens_total", scope),
+            "completion_tokens": counter_value("llm_completion_tokens_total", scope),
+            "estimated_cost_usd": round(counter_value("llm_cost_usd_total", scope), 6),
+        },
+        "ocr_images": {
+            result: counter_value("ocr_images_total", scope, result=result)
+            for result in ("cached", "ocr", "failed", "skipped")
+        },
+        "caches": caches,
+    }
+
+def _format_counters():
+    with _lock:
+        return [
+            {"name": name, "labels": dict(items), "value": value}
+            for (name, items), value in sorted(_counters.items())
+        ]
+
+def write_trace(path=None):
+    """
+    Write spans, counters and the run summary as one JSON document.
+    """
+    path = path or TRACE_FILE
+    if not path:
+        return None
+    with _lock:
+        spans = list(_spans)
+        dropped = _dropped_spans
+    document = {
+        "summary": summary(),
+        "counters": _format_counters(),
+        "spans": spans,
+        "dropped_spans": dropped,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, default=str)
+    log.info(f"📈 Trace written to {path}")
+    return path
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+def prometheus_text():
+    lines = []
+    seen = set()
+    for entry in _format_counters():
+        name = METRIC_PREFIX + entry["name"]
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_prometheus_labels(entry['labels'])} {entry['value']}")
+
+    with _lock:
+        totals = sorted(_stage_totals.items())
+    lines.append(f"# TYPE {METRIC_PREFIX}span_seconds summary")
+    for name, (count, seconds, errors) in totals:
+        labels = _prometheus_labels({"span": name})
+        lines.append(f"{METRIC_PREFIX}span_seconds_sum{labels} {seconds:.6f}")
+        lines.append(f"{METRIC_PREFIX}span_seconds_count{labels} {count}")
+    lines.append(f"# TYPE {METRIC_PREFIX}span_errors_total counter")
+    for name, (count, seconds, errors) in totals:
+        lines.append(f"{METRIC_PREFIX}span_errors_total{_prometheus_labels({'span': name})} {errors}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serve /metrics in Prometheus text format from a background thread.
+    Returns the server, or None when no port is configured.
+    """
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,77 @@
+import re
+import zlib
+import numpy as np
+from scipy import sparse
+
+from scripts.text_utils import WORD
+
+# Width of the hashed feature space; collisions are rare at this size and
+# a dense vector over it is only 1 MB of float32
+HASH_FEATURES = 2**18
+
+# Sentence ends: ., ! or ? followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Words that carry no topic signal in English training material. Negations
+# (not, no) are kept so "not clear" never matches "clear".
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or
+so than that the their then there these this to was were will with you your we
+our can do does how what when which who why all any each more most other
+some such only own same too very just also may might must should would could
+""".split())
+
+# Articles, pronouns, prepositions and forms of "be" only: for short texts
+# where modifiers ("too", "more", "should", "not") and numbers decide the meaning
+FUNCTION_WORDS = frozenset("""
+a an and are as at be been by for from in into is it its of on or that the
+their them they this these those to was were with you your we our i me my
+""".split())
+
+def words(text, stop_words=STOP_WORDS):
+    return [w for w in WORD.findall(text.lower()) if w not in stop_words]
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text) if s and s.strip()]
+
+def feature_id(word):
+    return zlib.crc32(word.encode("utf-8")) % HASH_FEATURES
+
+def term_counts(texts, stop_words=STOP_WORDS):
+    """
+    Sparse (len(texts) x HASH_FEATURES) matrix of hashed word counts.
+    """
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        ids = [feature_id(w) for w in words(text, stop_words)]
+        rows.extend([row] * len(ids))
+        cols.extend(ids)
+    data = np.ones(len(cols), dtype=np.float32)
+    counts = sparse.csr_matrix((data, (rows, cols)), shape=(len(texts), HASH_FEATURES), dtype=np.float32)
+    counts.sum_duplicates()
+    return counts
+
+def l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms).dot(matrix).tocsr()
+
+def tfidf_matrix(texts, stop_words=STOP_WORDS):
+    """
+    Rows of L2-normalised TF-IDF weights (sublinear term frequency,
+    smoothed IDF) over hashed words, so cosine similarity is a dot product.
+    Pass stop_words=FUNCTION_WORDS when words like "too" or "should"
+    change the meaning. Returns the matrix and the IDF vector.
+    """
+    counts = term_counts(texts, stop_words)
+    document_frequency = np.bincount(counts.indices, minlength=HASH_FEATURES)
+    idf = (np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+    counts.data = 1 + np.log(counts.data)
+    return l2_normalize(counts.multiply(idf).tocsr()), idf
+
+def row_dot(matrix, row, dense):
+    """
+    Dot product of one CSR row with a dense vector.
+    """
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    return float(matrix.data[start:end] @ dense[matrix.indices[start:end]])
@@ -0,0 +1,12 @@
+import re
+
+# Extractors separate pages, slides and paragraphs with blank lines
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+WORD = re.compile(r"\w+")
+
+def normalize_text(text):
+    """
+    Lowercased words joined by single spaces: copies that differ only in
+    case, punctuation or spacing normalise to the same string.
+    """
+    return " ".join(WORD.findall(text.lower()))
@@ -0,0 +1,60 @@
+import os
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a character estimate
+    tiktoken = None
+
+log = logging.getLogger(__name__)
+
+# Encoding used by gpt-4o / gpt-4o-mini
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+# Rough characters-per-token ratio used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """
+    Return the tiktoken encoding, or None when tiktoken is not installed or
+    its BPE file cannot be loaded (e.g. offline without a local copy).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        log.warning(f"⚠️ tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def split_tokens(text, max_tokens):
+    """
+    Split text into pieces of at most max_tokens tokens each.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    ids = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+def tail_tokens(text, max_tokens):
+    """
+    Return the last max_tokens tokens of text.
+    """
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[-max_tokens * CHARS_PER_TOKEN:]
+    ids = encoding.encode(text, disallowed_special=())
+    return encoding.decode(ids[-max_tokens:])
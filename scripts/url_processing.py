@@ -1,29 +1,91 @@
+import os
+import logging
 import requests
 from readability import Document
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import time
 from PIL import Image
 from io import BytesIO
-import pytesseract
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 
-# ---------- USE SELENIUM TO LOAD PAGE ----------
-def fetch_with_selenium(url):
-    print(f"🔍 Using Selenium to load: {url}")
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-gpu")
+from scripts.ocr_utils import ocr_images_from_bytes
+from scripts.http_client import get_http_session, HTTP_TIMEOUT
+from scripts.telemetry import in_current_scope, incr, span
+
+log = logging.getLogger(__name__)
+
+# Pages whose readable text is shorter than this are re-fetched with the browser
+MIN_STATIC_TEXT_CHARS = int(os.getenv("MIN_STATIC_TEXT_CHARS", "500"))
+# Concurrent image downloads per page, and the largest image body accepted
+IMAGE_FETCH_WORKERS = int(os.getenv("IMAGE_FETCH_WORKERS", "8"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "5"))
+# Largest HTML page read by the static fetch
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", str(5 * 1024 * 1024)))
+# Phrases that mark a client-rendered page shell
+JS_SHELL_MARKERS = (
+    "enable javascript",
+    "javascript is required",
+    "requires javascript",
+    "javascript to run this app",
+)
 
-    driver = webdriver.Chrome(options=options)
+# ---------- PLAIN HTTP FETCH (FAST PATH) ----------
+class NotHtmlError(Exception):
+    """
+    The URL serves something other than a web page (a PDF, a video, ...)
+    or a page larger than PAGE_MAX_BYTES; the browser would not do better.
+    """
 
+def fetch_static(url):
+    """
+    Stream a page through the pooled HTTP session. Returns (html, final_url),
+    or None when the browser should try instead. Raises NotHtmlError when the
+    headers announce a non-HTML body or the body exceeds PAGE_MAX_BYTES.
+    """
     try:
-        driver.get(url)
-        time.sleep(5)  # Let JS load
+        with span("url.fetch_static", url=url), \
+                get_http_session().get(url, timeout=HTTP_TIMEOUT, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type:
+                return None
+            if "html" not in content_type.lower():
+                raise NotHtmlError(f"not an HTML page ({content_type})")
+            declared = int(response.headers.get("Content-Length") or 0)
+            if declared > PAGE_MAX_BYTES:
+                raise NotHtmlError(f"page too large ({declared} bytes)")
+
+            buffer = BytesIO()
+            for block in response.iter_content(chunk_size=64 * 1024):
+                buffer.write(block)
+                if buffer.tell() > PAGE_MAX_BYTES:
+                    raise NotHtmlError(f"page too large (>{PAGE_MAX_BYTES} bytes)")
+            return buffer.getvalue().decode(response.encoding or "utf-8", errors="replace"), response.url
+    except requests.RequestException as e:
+        log.warning(f"⚠️ Static fetch failed for {url} — {e}")
+        return None
+
+def looks_like_js_shell(html):
+    lowered = html.lower()
+    return any(marker in lowered for marker in JS_SHELL_MARKERS)
+
+# ---------- USE SELENIUM TO LOAD PAGE ----------
+def fetch_with_selenium(url):
+    # Selenium is only imported once a page actually needs the browser tier
+    from selenium.common.exceptions import TimeoutException
+    from scripts.browser_pool import get_driver_pool, wait_until_ready
+
+    log.info(f"🔍 Using Selenium to load: {url}")
+    with span("url.fetch_browser", url=url), get_driver_pool().driver() as driver:
+        try:
+            driver.get(url)
+        except TimeoutException:
+            log.info(f"⏱️ Page load timed out, using current DOM: {url}")
+        if not wait_until_ready(driver):
+            log.info(f"⏱️ Page did not settle before timeout, using current DOM: {url}")
         return driver.page_source, driver.current_url  # Return resolved base URL too
-    finally:
-        driver.quit()
 
 # ---------- PARSE MAIN ARTICLE CONTENT WITH READABILITY ----------
 def parse_main_content_with_readability(html):
@@ -34,11 +96,37 @@ def parse_main_content_with_readability(html):
     main_text = soup.get_text(separator="\n", strip=True)
     return title, main_text
 
+# ---------- DOWNLOAD A SINGLE IMAGE WITH SIZE AND TYPE GUARDS ----------
+def download_image(img_url):
+    """
+    Stream an image through the pooled session. Returns the bytes, or None
+    when the response is not an image or exceeds IMAGE_MAX_BYTES.
+    """
+    with get_http_session().get(img_url, timeout=IMAGE_FETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.lower().startswith("image/"):
+            log.warning(f"⚠️ Skipping non-image response ({content_type or 'no type'}): {img_url}")
+            return None
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > IMAGE_MAX_BYTES:
+            log.warning(f"⚠️ Skipping oversized image ({declared} bytes): {img_url}")
+            return None
+
+        buffer = BytesIO()
+        for block in response.iter_content(chunk_size=64 * 1024):
+            buffer.write(block)
+            if buffer.tell() > IMAGE_MAX_BYTES:
+                log.warning(f"⚠️ Aborted oversized image (>{IMAGE_MAX_BYTES} bytes): {img_url}")
+                return None
+        return buffer.getvalue()
+
 # ---------- PARSE IMAGES FROM ORIGINAL HTML ----------
-def extract_images_from_html(html, base_url=None):
+def extract_images_from_html(html, base_url=None, keep_image_bytes=False):
     soup = BeautifulSoup(html, 'html.parser')
 
-    image_data = []
+    # Resolve and de-duplicate image URLs, keeping the first occurrence
+    candidates = {}
     for idx, img in enumerate(soup.find_all('img')):
         img_url = img.get('src')
         alt_text = img.get('alt', '').strip()
@@ -47,38 +135,94 @@ def extract_images_from_html(html, base_url=None):
             continue
 
         if base_url and not img_url.startswith(('http', 'https')):
-            from urllib.parse import urljoin
             img_url = urljoin(base_url, img_url)
 
+        if img_url in candidates:
+            if alt_text and not candidates[img_url][1]:
+                candidates[img_url] = (candidates[img_url][0], alt_text)
+            continue
+        candidates[img_url] = (idx, alt_text)
+
+    if not candidates:
+        return []
+
+    # Download concurrently over the shared connection pool
+    urls = list(candidates)
+    with span("url.download_images", images=len(urls)):
+        with ThreadPoolExecutor(max_workers=min(IMAGE_FETCH_WORKERS, len(urls))) as executor:
+            futures = [executor.submit(in_current_scope(download_image), img_url) for img_url in urls]
+
+    image_data = []
+    for img_url, future in zip(urls, futures):
+        idx, alt_text = candidates[img_url]
         try:
-            img_resp = requests.get(img_url, timeout=5)
-            img_obj = Image.open(BytesIO(img_resp.content))
-
-            if not alt_text:
-                alt_text = pytesseract.image_to_string(img_obj).strip()
-
-            image_data.append({
-                "index": idx,
-                "url": img_url,
-                "alt_or_ocr": alt_text,
-                "image_bytes": img_resp.content
-            })
+            image_bytes = future.result()
+            if image_bytes is None:
+                continue
+            Image.open(BytesIO(image_bytes))
         except Exception as e:
-            print(f"⚠️ Failed to load image: {img_url} — {e}")
+            log.warning(f"⚠️ Failed to load image: {img_url} — {e}")
+            continue
+
+        image_data.append({
+            "index": idx,
+            "url": img_url,
+            "alt_or_ocr": alt_text,
+            "image_bytes": image_bytes
+        })
+
+    # OCR only images without alt text, as one batch on the OCR pool
+    missing_alt = [img for img in image_data if not img["alt_or_ocr"]]
+    ocr_texts = ocr_images_from_bytes(img["image_bytes"] for img in missing_alt)
+    for img, ocr_text in zip(missing_alt, ocr_texts):
+        img["alt_or_ocr"] = ocr_text
+
+    if not keep_image_bytes:
+        for img in image_data:
+            del img["image_bytes"]
 
     return image_data
 
+# ---------- TIERED FETCH: STATIC HTTP FIRST, BROWSER ONLY WHEN NEEDED ----------
+def fetch_and_parse(url):
+    """
+    Returns (html, final_url, title, main_text, tier) where tier is
+    "static" or "browser".
+    """
+    reason = "static fetch failed"
+    # NotHtmlError propagates: a PDF or video link is not handed to the browser
+    page = fetch_static(url)
+    if page is not None:
+        html, final_url = page
+        title, main_text = parse_main_content_with_readability(html)
+        if looks_like_js_shell(html):
+            reason = "JavaScript shell detected"
+        elif len(main_text) < MIN_STATIC_TEXT_CHARS:
+            reason = f"only {len(main_text)} chars of static text"
+        else:
+            log.info(f"⚡ Tier: static — {url}")
+            incr("url_fetches_total", tier="static")
+            return html, final_url, title, main_text, "static"
+
+    html, final_url = fetch_with_selenium(url)
+    title, main_text = parse_main_content_with_readability(html)
+    log.info(f"🌐 Tier: browser — {url} ({reason})")
+    incr("url_fetches_total", tier="browser")
+    return html, final_url, title, main_text, "browser"
+
 # ---------- EXPOSED FUNCTION ----------
-def extract_content_from_url(url):
+def extract_content_from_url(url, keep_image_bytes=False):
     try:
-        html, final_url = fetch_with_selenium(url)
-        title, main_text = parse_main_content_with_readability(html)
-        images = extract_images_from_html(html, base_url=final_url)
+        with span("url.extract", url=url) as attrs:
+            html, final_url, title, main_text, tier = fetch_and_parse(url)
+            images = extract_images_from_html(html, base_url=final_url, keep_image_bytes=keep_image_bytes)
+            attrs.update(tier=tier, chars=len(main_text), images=len(images))
         return {
             "title": title,
             "text": main_text,
-            "images": images
+            "images": images,
+            "tier": tier,
         }
     except Exception as e:
-        print(f"❌ Extraction failed for {url} — {e}")
+        log.error(f"❌ Extraction failed for {url} — {e}")
         return None
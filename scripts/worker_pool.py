@@ -0,0 +1,109 @@
+import os
+import logging
+import atexit
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+# Number of worker processes shared by OCR and PDF extraction.
+# 0 or 1 runs all work serially in this process.
+WORKER_PROCESSES = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+_executor = None
+_executor_workers = 0
+_lock = threading.Lock()
+
+def get_process_pool(max_workers=None):
+    """
+    Return the shared process pool, creating it on first use.
+    Returns None when work should run serially.
+    """
+    global _executor, _executor_workers
+    workers = WORKER_PROCESSES if max_workers is None else max_workers
+    if workers <= 1:
+        return None
+    with _lock:
+        if _executor is None or _executor_workers != workers:
+            _shutdown_pool()
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+        return _executor
+
+def shutdown_process_pool():
+    with _lock:
+        _shutdown_pool()
+
+def _shutdown_pool():
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+    _executor = None
+    _executor_workers = 0
+
+atexit.register(shutdown_process_pool)
+
+def map_on_pool(func, jobs, max_workers=None):
+    """
+    Map func over jobs on the shared pool, in order, falling back to running
+    them in this process when the pool is disabled or broken.
+    """
+    jobs = list(jobs)
+    if len(jobs) <= 1:
+        return [func(job) for job in jobs]
+    # Everything is submitted up front, as executor.map would
+    return list(imap_on_pool(func, jobs, max_workers, prefetch=len(jobs)))
+
+def imap_on_pool(func, jobs, max_workers=None, prefetch=None):
+    """
+    Like map_on_pool, but yields results in order as they complete while
+    keeping at most prefetch jobs in flight, so memory stays bounded for
+    long job streams.
+
+    A job is queued before it is submitted, so when the pool breaks every
+    job not yet finished is rerun in this process. Only a failed submit or
+    a BrokenProcessPool counts as the pool failing; an exception raised by
+    func itself is passed to the caller as it would be in serial mode.
+    """
+    executor = get_process_pool(max_workers)
+    if executor is None:
+        for job in jobs:
+            yield func(job)
+        return
+
+    prefetch = prefetch or 2 * (max_workers or WORKER_PROCESSES)
+    # (job, future); future is None for jobs to run in this process
+    pending = deque()
+    broken = False
+
+    def fall_back(e):
+        nonlocal broken
+        if not broken:
+            broken = True
+            log.warning(f"⚠️ Worker pool unavailable, falling back to serial processing: {e}")
+            shutdown_process_pool()
+
+    def next_result():
+        job, future = pending.popleft()
+        if future is not None:
+            try:
+                return future.result()
+            except BrokenProcessPool as e:
+                fall_back(e)
+        return func(job)
+
+    for job in jobs:
+        future = None
+        if not broken:
+            try:
+                future = executor.submit(func, job)
+            except (BrokenProcessPool, RuntimeError, OSError) as e:
+                # Raised by the pool (broken, shut down, cannot start a worker), never by func
+                fall_back(e)
+        pending.append((job, future))
+        while pending and (broken or len(pending) >= prefetch):
+            yield next_result()
+    while pending:
+        yield next_result()
@@ -1,11 +1,18 @@
-import re
-import requests
-from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup
 import json
 from typing import List, Dict, Optional
-import time
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.compress import extractive_summary
+from scripts.http_client import get_download_session, get_http_session
+from scripts.google_url_processing import (
+    extract_doc_id,
+    extract_google_docs,
+    extract_google_sheets,
+    extract_google_slides,
+    identify_google_service,
+)
 
 @dataclass
 class ExtractedContent:
@@ -16,109 +23,37 @@ class ExtractedContent:
     summary: str = ""
 
 class GoogleContentExtractor:
-    def __init__(self):
-        self.session = requests.Session()
-        # Set headers to mimic a real browser
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive'
-        })
-    
-    def identify_google_service(self, url: str) -> str:
-        """Identify which Google service the URL belongs to"""
-        if 'docs.google.com/document' in url:
-            return 'docs'
-        elif 'docs.google.com/spreadsheets' in url:
-            return 'sheets'
-        elif 'docs.google.com/presentation' in url:
-            return 'slides'
-        elif 'drive.google.com' in url:
-            return 'drive'
-        else:
-            return 'unknown'
-    
-    def convert_to_export_url(self, url: str, service_type: str) -> str:
-        """Convert Google service URLs to export/public URLs"""
+    def __init__(self, max_workers: int = 4):
+        # Shared pooled session (browser-like headers, keep-alive, retries)
+        self.session = get_http_session()
+        # Exports go through the download manager, which handles 429 / 503 itself
+        self.download_session = get_download_session()
+        self.max_workers = max_workers
+    
+    def _extract_native(self, url: str, doc_type: str, extractor, label: str) -> Optional[ExtractedContent]:
+        """Fetch a Google document through the shared native-export path"""
         try:
-            if '/d/' in url:
-                doc_id = url.split('/d/')[1].split('/')[0]
-            else:
-                parsed = urlparse(url)
-                if 'id=' in parsed.query:
-                    doc_id = parse_qs(parsed.query)['id'][0]
-                else:
-                    return url
-            
-            if service_type == 'docs':
-                return f"https://docs.google.com/document/d/{doc_id}/export?format=txt"
-            elif service_type == 'sheets':
-                return f"https://docs.google.com/spreadsheets/d/{doc_id}/export?format=csv"
-            elif service_type == 'slides':
-                return f"https://docs.google.com/presentation/d/{doc_id}/export/txt"
-            elif service_type == 'drive':
-                return f"https://drive.google.com/file/d/{doc_id}/view"
+            doc_id = extract_doc_id(url)
+            result = extractor(doc_id, self.download_session)
+            if result:
+                text, ocr_texts = result
+                content = "\n\n".join([text] + ocr_texts) if ocr_texts else text
+                return ExtractedContent(url, f"{label} {doc_id[:8]}", content, doc_type)
         except Exception as e:
-            print(f"Error converting URL: {e}")
-            return url
-        
-        return url
-    
+            print(f"Error extracting from {label}: {e}")
+        return None
+
     def extract_from_docs(self, url: str) -> Optional[ExtractedContent]:
         """Extract content from Google Docs"""
-        try:
-            doc_id = url.split('/d/')[1].split('/')[0]
-            export_url = f"https://docs.google.com/document/d/{doc_id}/export?format=txt"
-            print(f"Export URL: {export_url}")
-            response = self.session.get(export_url)
-            print(f"Response status code: {response}")
-            if response.status_code == 200:
-                content = response.text
-                title = f"Google Doc {doc_id[:8]}"
-                return ExtractedContent(url, title, content, 'docs')
-            else:
-                html_url = f"https://docs.google.com/document/d/{doc_id}/export?format=html"
-                response = self.session.get(html_url)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    content = soup.get_text(strip=True)
-                    title = soup.find('title').text if soup.find('title') else f"Google Doc {doc_id[:8]}"
-                    return ExtractedContent(url, title, content, 'docs')
-        except Exception as e:
-            print(f"Error extracting from Google Docs: {e}")
-        return None
+        return self._extract_native(url, 'docs', extract_google_docs, "Google Doc")
     
     def extract_from_sheets(self, url: str) -> Optional[ExtractedContent]:
-        """Extract content from Google Sheets"""
-        try:
-            doc_id = url.split('/d/')[1].split('/')[0]
-            export_url = f"https://docs.google.com/spreadsheets/d/{doc_id}/export?format=csv"
-            
-            response = self.session.get(export_url)
-            if response.status_code == 200:
-                content = response.text
-                title = f"Google Sheet {doc_id[:8]}"
-                return ExtractedContent(url, title, content, 'sheets')
-        except Exception as e:
-            print(f"Error extracting from Google Sheets: {e}")
-        return None
+        """Extract content from Google Sheets (every sheet when openpyxl is installed)"""
+        return self._extract_native(url, 'sheets', extract_google_sheets, "Google Sheet")
     
     def extract_from_slides(self, url: str) -> Optional[ExtractedContent]:
-        """Extract content from Google Slides"""
-        try:
-            doc_id = url.split('/d/')[1].split('/')[0]
-            export_url = f"https://docs.google.com/presentation/d/{doc_id}/export/txt"
-            
-            response = self.session.get(export_url)
-            if response.status_code == 200:
-                content = response.text
-                title = f"Google Slides {doc_id[:8]}"
-                return ExtractedContent(url, title, content, 'slides')
-        except Exception as e:
-            print(f"Error extracting from Google Slides: {e}")
-        return None
+        """Extract content from Google Slides, including OCR of slide images"""
+        return self._extract_native(url, 'slides', extract_google_slides, "Google Slides")
     
     def extract_from_drive(self, url: str) -> Optional[ExtractedContent]:
         """Extract content from Google Drive files"""
@@ -141,7 +76,7 @@ class GoogleContentExtractor:
     
     def extract_content(self, url: str) -> Optional[ExtractedContent]:
         """Main method to extract content from any Google service URL"""
-        service_type = self.identify_google_service(url)
+        service_type = identify_google_service(url)
         print("Service type identified:", service_type)
         if service_type == 'docs':
             return self.extract_from_docs(url)
@@ -156,51 +91,32 @@ class GoogleContentExtractor:
             return None
     
     def simple_summarize(self, text: str, max_sentences: int = 3) -> str:
-        """Simple text summarization by extracting key sentences"""
+        """Extractive summary: the most central, least redundant sentences in text order"""
         if not text.strip():
             return "No content to summarize."
-        
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        if len(sentences) <= max_sentences:
-            return ' '.join(sentences)
-        summary_sentences = []
-        
-        if sentences:
-            summary_sentences.append(sentences[0])  
-        
-        if len(sentences) > 2:
-            longest = max(sentences[1:-1], key=len, default="")
-            if longest and longest not in summary_sentences:
-                summary_sentences.append(longest)
-        
-        if len(sentences) > 1 and len(summary_sentences) < max_sentences:
-            summary_sentences.append(sentences[-1])  
-        
-        return '. '.join(summary_sentences) + '.'
+        return extractive_summary(text, max_sentences=max_sentences) or text.strip()[:500]
+    
+    def process_url(self, url: str) -> Optional[ExtractedContent]:
+        """Extract and summarize a single URL"""
+        print(f"Processing: {url}")
+        try:
+            extracted = self.extract_content(url)
+            if extracted:
+                extracted.summary = self.simple_summarize(extracted.content)
+                print(f"✓ Successfully extracted from {extracted.doc_type}")
+                return extracted
+            print(f"✗ Failed to extract content")
+        except Exception as e:
+            print(f"✗ Error processing URL: {e}")
+        return None
     
     def process_urls(self, urls: List[str]) -> List[ExtractedContent]:
-        """Process multiple URLs and extract content"""
-        results = []
-        
-        for url in urls:
-            print(f"Processing: {url}")
-            try:
-                extracted = self.extract_content(url)
-                if extracted:
-                    extracted.summary = self.simple_summarize(extracted.content)
-                    results.append(extracted)
-                    print(f"✓ Successfully extracted from {extracted.doc_type}")
-                else:
-                    print(f"✗ Failed to extract content")
-                
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"✗ Error processing URL: {e}")
-        
-        return results
+        """Process multiple URLs concurrently and extract content"""
+        # The download manager bounds concurrency and backs off on rate limits,
+        # so no fixed delay between URLs is needed
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(urls)))) as executor:
+            results = list(executor.map(self.process_url, urls))
+        return [result for result in results if result]
 
 def main():
     # Example usage